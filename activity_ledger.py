@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from atomic_file import atomic_write_json
+from github_client import count_push_commits, parse_github_time
+
+LEDGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'github_activity.json')
+SAVE_DELAY = 30  # Seconds to wait for more changes before saving the ledger
+RETENTION_DAYS = 35  # Days of daily counts kept per user
+EVENT_LAG = timedelta(hours=6)  # GitHub can publish events a while after they happen
+
+def format_github_time(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class ActivityLedger:
+    """
+    Local record of every GitHub user's push activity, available as
+    bot.activity_ledger.
+
+    A background poller tops it up with only the events published since
+    the last poll. Events are keyed by ID so overlapping polls never count
+    a push twice, and per-day commit counts are kept so weekly totals are
+    a dictionary lookup instead of a GitHub sweep.
+    """
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        self._users = {}
+        self._save_handle = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                self._users = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._users = {}
+        return self
+
+    def __contains__(self, username):
+        return username.lower() in self._users
+
+    async def sync_user(self, github, username):
+        """
+        Fetches the user's events since their last sync and records any
+        pushes not seen before. Raises GitHubError if GitHub can't be reached.
+        """
+        now = datetime.now(timezone.utc)
+        entry = self._users.setdefault(username.lower(), {
+            'daily': {},
+            'event_ids': {},
+            'latest_push': None,
+            'synced_at': None,
+        })
+        if entry['synced_at']:
+            since = parse_github_time(entry['synced_at']) - EVENT_LAG
+        else:
+            since = now - timedelta(days=RETENTION_DAYS)
+
+        async for event in github.iter_events(username, since=since):
+            if event['type'] != 'PushEvent' or event['id'] in entry['event_ids']:
+                continue
+            day = event['created_at'][:10]
+            entry['event_ids'][event['id']] = day
+            entry['daily'][day] = entry['daily'].get(day, 0) + count_push_commits(event)
+            if entry['latest_push'] is None or event['created_at'] > entry['latest_push']:
+                entry['latest_push'] = event['created_at']
+
+        entry['synced_at'] = format_github_time(now)
+        self._prune(entry, now)
+        self._schedule_save()
+
+    def _prune(self, entry, now):
+        cutoff = (now - timedelta(days=RETENTION_DAYS)).strftime('%Y-%m-%d')
+        entry['daily'] = {day: count for day, count in entry['daily'].items() if day >= cutoff}
+        entry['event_ids'] = {event_id: day for event_id, day in entry['event_ids'].items() if day >= cutoff}
+
+    def daily_commits(self, username, days=7):
+        """
+        Returns {day: commits} for the last `days` UTC days, today included.
+        """
+        daily = self._users.get(username.lower(), {}).get('daily', {})
+        today = datetime.now(timezone.utc)
+        counts = {}
+        for i in range(days):
+            day = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+            counts[day] = daily.get(day, 0)
+        return counts
+
+    def latest_push(self, username):
+        return self._users.get(username.lower(), {}).get('latest_push')
+
+    def _schedule_save(self):
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(SAVE_DELAY, self.save)
+
+    def save(self):
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        atomic_write_json(self.path, self._users)
+
+    async def close(self):
+        self.save()
@@ -0,0 +1,23 @@
+import json
+import os
+import tempfile
+
+def atomic_write_bytes(path, data):
+    """
+    Writes data to path via a temp file in the same directory and a rename,
+    so readers never see a half-written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def atomic_write_json(path, data, **dump_kwargs):
+    atomic_write_bytes(path, json.dumps(data, **dump_kwargs).encode('utf-8'))
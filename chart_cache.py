@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from atomic_file import atomic_write_bytes
+
+CHART_CACHE_BYTES = 32 * 1024 * 1024  # Total PNG bytes kept in memory
+
+def chart_key(*parts):
+    """
+    Hashes everything a chart is rendered from into its cache key.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class ChartCache:
+    """
+    LRU cache of rendered chart PNGs, available as bot.chart_cache.
+
+    Entries are keyed by a hash of the chart's inputs, so a repeated
+    request is served without rendering anything, and are grouped by tag
+    (e.g. "leaderboard") so a whole kind of chart can be dropped when its
+    data changes. The cache is bounded by total bytes and can optionally
+    mirror its entries to a directory so they survive restarts.
+    """
+    def __init__(self, max_bytes=CHART_CACHE_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (tag, png)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_directory()
+
+    def _path(self, tag, key):
+        return os.path.join(self.directory, f'{tag}-{key}.png')
+
+    def _load_directory(self):
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.png')]
+        # Oldest first, so the most recently written charts end up most recently used
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            tag, _, key = entry.name[:-4].rpartition('-')
+            with open(entry.path, 'rb') as file:
+                self._store(key, tag, file.read())
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, png, tag='chart'):
+        self._store(key, tag, png)
+        if self.directory:
+            atomic_write_bytes(self._path(tag, key), png)
+
+    def _store(self, key, tag, png):
+        self._remove(key)
+        self._entries[key] = (tag, png)
+        self.size += len(png)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+        if self.directory:
+            try:
+                os.remove(self._path(entry[0], key))
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, tag):
+        """
+        Drops every cached chart with the given tag.
+        """
+        for key in [key for key, (entry_tag, _) in self._entries.items() if entry_tag == tag]:
+            self._remove(key)
@@ -0,0 +1,99 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+from matplotlib.figure import Figure
+
+RENDER_WORKERS = 2
+BACKGROUND_COLOR = '#36393F'  # Discord dark theme
+LINE_COLOR = '#5865F2'
+BAR_COLORS = ['#5865F2', '#57F287', '#FEE75C', '#EB459E', '#ED4245', '#9B59B6', '#3498DB', '#2ECC71']
+# Everything about the look of a chart, so cached charts change with it
+THEME = (BACKGROUND_COLOR, LINE_COLOR, *BAR_COLORS)
+
+def _style_axes(ax):
+    ax.set_facecolor(BACKGROUND_COLOR)
+    ax.xaxis.label.set_color('white')
+    ax.yaxis.label.set_color('white')
+    ax.title.set_color('white')
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white')
+
+def _to_png(figure):
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png', bbox_inches='tight', facecolor=BACKGROUND_COLOR)
+    return buf.getvalue()
+
+def render_line_chart(values, tick_positions, tick_labels, title, xlabel, ylabel, markers=True):
+    """
+    Renders a line chart to PNG bytes. Runs inside a worker process.
+    """
+    figure = Figure(figsize=(10, 5), facecolor=BACKGROUND_COLOR)
+    ax = figure.add_subplot()
+    ax.plot(range(len(values)), values, marker='o' if markers else None, linestyle='-', color=LINE_COLOR)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_xticks(tick_positions, tick_labels)
+    _style_axes(ax)
+    return _to_png(figure)
+
+def render_bar_chart(labels, values, title, ylabel):
+    """
+    Renders a bar chart with a value label on each bar to PNG bytes. Runs
+    inside a worker process.
+    """
+    figure = Figure(figsize=(10, 6), facecolor=BACKGROUND_COLOR)
+    ax = figure.add_subplot()
+    ax.bar(range(len(labels)), values, color=BAR_COLORS[:len(labels)])
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right')
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    _style_axes(ax)
+    for i, v in enumerate(values):
+        ax.text(i, v + max(values) * 0.03, str(v), color='white', ha='center')
+    figure.tight_layout()
+    return _to_png(figure)
+
+def _warm_up():
+    # Loads fonts and the Agg backend so the first real chart is fast
+    render_line_chart([0, 1], [0, 1], ['a', 'b'], '', '', '')
+
+class ChartRenderer:
+    """
+    Renders charts in a pool of worker processes, available as
+    bot.chart_renderer, so building a figure never blocks the event loop.
+    Charts use matplotlib's Figure API rather than pyplot's global state
+    and come back as PNG bytes ready for discord.File.
+    """
+    def __init__(self, workers=RENDER_WORKERS):
+        self.workers = workers
+        # Fork so workers don't re-run locomotion.py the way spawn would
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_warm_up,
+        )
+
+    async def start(self):
+        """
+        Starts every worker up front, before the bot has other threads
+        around to fork.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, abs, 0) for _ in range(self.workers)))
+
+    async def _render(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def line_chart(self, values, tick_positions, tick_labels, title, xlabel, ylabel, markers=True):
+        return await self._render(render_line_chart, list(values), list(tick_positions), list(tick_labels), title, xlabel, ylabel, markers)
+
+    async def bar_chart(self, labels, values, title, ylabel):
+        return await self._render(render_bar_chart, list(labels), list(values), title, ylabel)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
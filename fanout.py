@@ -0,0 +1,23 @@
+import asyncio
+
+async def gather_bounded(items, func, concurrency=8, timeout=20):
+    """
+    Runs func(item) for every item concurrently, with at most `concurrency`
+    calls in flight and each call limited to `timeout` seconds.
+
+    Returns the results in the same order as `items`. A call that raised or
+    timed out leaves its exception in its slot instead of failing the rest,
+    so callers can report partial failures.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await asyncio.wait_for(func(item), timeout)
+
+    return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
+def describe_failure(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return "timed out"
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+GITHUB_API_URL = 'https://api.github.com'
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'github_cache.db')
+OLD_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'github_cache.json')
+CACHE_MAX_AGE = 7 * 24 * 3600  # Seconds an entry is kept after it was last fetched or revalidated
+EVICT_INTERVAL = 3600  # Seconds between sweeps for expired entries
+ANONYMOUS_RATE_LIMIT = 60  # Requests per hour without a token
+TOKEN_RATE_LIMIT = 5000  # Requests per hour with a token
+EVENTS_PER_PAGE = 100  # GitHub's maximum
+# The only parts of an event anything reads, so cached pages stay small
+EVENT_FIELDS = ('id', 'type', 'created_at')
+PAYLOAD_FIELDS = ('distinct_size', 'size')
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key TEXT PRIMARY KEY,
+    etag TEXT,
+    data TEXT NOT NULL,
+    next TEXT,
+    fetched_at REAL NOT NULL,
+    poll_interval INTEGER NOT NULL
+);
+"""
+
+def parse_github_time(timestamp):
+    return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+
+def count_push_commits(event):
+    """
+    Returns how many commits a PushEvent carried, preferring distinct commits.
+    """
+    payload = event.get('payload', {})
+    return payload.get('distinct_size', payload.get('size', 1))
+
+def slim_events(events):
+    """
+    Strips a page of events down to EVENT_FIELDS and PAYLOAD_FIELDS.
+    """
+    slim = []
+    for event in events:
+        payload = event.get('payload') or {}
+        entry = {field: event.get(field) for field in EVENT_FIELDS}
+        entry['payload'] = {field: payload[field] for field in PAYLOAD_FIELDS if field in payload}
+        slim.append(entry)
+    return slim
+
+class GitHubError(Exception):
+    """
+    Raised when GitHub can't answer a request (rate limited, server error...).
+    """
+
+class RateLimiter:
+    """
+    Token bucket that spends GitHub's hourly request budget evenly and
+    follows the X-RateLimit-* headers when GitHub reports less than we think.
+    """
+    def __init__(self, limit, period=3600):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.blocked_until and now >= self.blocked_until:
+            # The window has reset, so the whole budget is back
+            self.blocked_until = 0
+            self.tokens = float(self.limit)
+        elif not self.blocked_until:
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if not self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if self.blocked_until:
+                    wait = self.blocked_until - time.monotonic()
+                else:
+                    wait = (1 - self.tokens) * self.period / self.limit
+                await asyncio.sleep(max(wait, 0.01))
+
+    def refund(self):
+        """
+        Gives back a token for a request GitHub didn't charge for (a 304).
+        """
+        self.tokens = min(self.limit, self.tokens + 1)
+
+    def block_for(self, seconds):
+        self.tokens = 0
+        self.blocked_until = time.monotonic() + max(seconds, 1)
+
+    def update(self, headers):
+        if 'X-RateLimit-Limit' in headers:
+            self.limit = int(headers['X-RateLimit-Limit'])
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        self._refill()
+        remaining = int(headers['X-RateLimit-Remaining'])
+        self.tokens = min(self.tokens, remaining)
+        if remaining == 0 and 'X-RateLimit-Reset' in headers:
+            self.block_for(int(headers['X-RateLimit-Reset']) - time.time())
+
+class GitHubClient:
+    """
+    Shared GitHub REST client, available as bot.github.
+
+    Responses are cached in SQLite with their ETags so repeat requests are
+    sent with If-None-Match and a 304 costs nothing (with a token) and
+    skips the download. Only the changed row is written per response,
+    event pages keep just the fields that are read, and entries nobody
+    has asked for in CACHE_MAX_AGE are dropped. Requests are paced by
+    a token bucket that follows GitHub's rate limit headers, and endpoints
+    that send X-Poll-Interval are answered from the cache until the
+    interval has passed.
+    """
+    def __init__(self, http_client, token=None, cache_path=CACHE_FILE):
+        self.http_client = http_client
+        self.token = token
+        self.cache_path = cache_path
+        self.rate_limiter = RateLimiter(TOKEN_RATE_LIMIT if token else ANONYMOUS_RATE_LIMIT)
+        self._db = sqlite3.connect(cache_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(CACHE_SCHEMA)
+        self._evicted_at = 0
+        self._evict()
+        # The old JSON cache held whole event pages and is never read again
+        if os.path.exists(OLD_CACHE_FILE):
+            os.remove(OLD_CACHE_FILE)
+
+    def _evict(self):
+        self._evicted_at = time.time()
+        with self._db:
+            self._db.execute('DELETE FROM responses WHERE fetched_at < ?', (self._evicted_at - CACHE_MAX_AGE,))
+
+    def _cached(self, cache_key):
+        row = self._db.execute(
+            'SELECT etag, data, next, fetched_at, poll_interval FROM responses WHERE cache_key = ?', (cache_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, data, next_link, fetched_at, poll_interval = row
+        return {'etag': etag, 'data': json.loads(data), 'next': next_link, 'fetched_at': fetched_at, 'poll_interval': poll_interval}
+
+    def _store(self, cache_key, entry):
+        with self._db:
+            self._db.execute(
+                'INSERT INTO responses (cache_key, etag, data, next, fetched_at, poll_interval) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (cache_key) DO UPDATE SET etag = excluded.etag, data = excluded.data, next = excluded.next, '
+                'fetched_at = excluded.fetched_at, poll_interval = excluded.poll_interval',
+                (cache_key, entry['etag'], json.dumps(entry['data']), entry['next'], entry['fetched_at'], entry['poll_interval'])
+            )
+        if time.time() - self._evicted_at >= EVICT_INTERVAL:
+            self._evict()
+
+    def _headers(self, cached):
+        headers = {
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28',
+        }
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        return headers
+
+    async def _request(self, url, params=None, trim=None):
+        """
+        GETs a URL and returns its cache entry ({'data': ..., 'next': ...}),
+        or None if GitHub says it doesn't exist. Raises GitHubError for
+        anything else. trim(data), if given, picks what's worth caching.
+        """
+        cache_key = url if not params else f"{url}?{'&'.join(f'{k}={v}' for k, v in sorted(params.items()))}"
+        cached = self._cached(cache_key)
+
+        if cached and time.time() - cached['fetched_at'] < cached.get('poll_interval', 0):
+            return cached
+
+        await self.rate_limiter.acquire()
+        async with self.http_client.get(url, params=params, headers=self._headers(cached)) as response:
+            self.rate_limiter.update(response.headers)
+
+            if response.status == 304 and cached:
+                # GitHub only waives 304s for authenticated requests
+                if self.token:
+                    self.rate_limiter.refund()
+                cached['fetched_at'] = time.time()
+                with self._db:
+                    self._db.execute('UPDATE responses SET fetched_at = ? WHERE cache_key = ?', (cached['fetched_at'], cache_key))
+                return cached
+
+            if response.status == 200:
+                next_link = response.links.get('next', {}).get('url')
+                data = await response.json()
+                entry = {
+                    'etag': response.headers.get('ETag'),
+                    'data': trim(data) if trim else data,
+                    'next': str(next_link) if next_link else None,
+                    'fetched_at': time.time(),
+                    'poll_interval': int(response.headers.get('X-Poll-Interval', 0)),
+                }
+                self._store(cache_key, entry)
+                return entry
+
+            if response.status == 404:
+                # Don't keep revalidating a user that's gone
+                with self._db:
+                    self._db.execute('DELETE FROM responses WHERE cache_key = ?', (cache_key,))
+                return None
+
+            if response.status in (403, 429):
+                retry_after = response.headers.get('Retry-After')
+                if retry_after:
+                    self.rate_limiter.block_for(int(retry_after))
+                raise GitHubError(f"Rate limited by GitHub while fetching {url}")
+
+            raise GitHubError(f"GitHub returned {response.status} for {url}")
+
+    async def get_json(self, path, params=None):
+        """
+        GETs an API path and returns the decoded JSON, or None if GitHub
+        says it doesn't exist. Raises GitHubError for anything else.
+        """
+        entry = await self._request(GITHUB_API_URL + path, params)
+        return entry['data'] if entry else None
+
+    async def get_user(self, username):
+        return await self.get_json(f'/users/{username}')
+
+    async def user_exists(self, username):
+        return await self.get_user(username) is not None
+
+    async def iter_events(self, username, since=None):
+        """
+        Streams the user's public events, newest first, one page at a time.
+
+        Stops at the first event older than `since` (an aware datetime),
+        so only the pages covering that window are requested. Raises
+        GitHubError if the user doesn't exist.
+        """
+        url = f'{GITHUB_API_URL}/users/{username}/events'
+        params = {'per_page': EVENTS_PER_PAGE}
+        while url:
+            page = await self._request(url, params, trim=slim_events)
+            if page is None:
+                raise GitHubError(f"GitHub user {username} not found")
+            for event in page['data']:
+                if since is not None and parse_github_time(event['created_at']) < since:
+                    return
+                yield event
+            # The next link already carries per_page
+            url, params = page.get('next'), None
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
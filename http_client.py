@@ -0,0 +1,75 @@
+import time
+from collections import defaultdict
+import aiohttp
+
+CONNECTION_LIMIT = 100  # Total open connections across all hosts
+CONNECTION_LIMIT_PER_HOST = 10
+KEEPALIVE_TIMEOUT = 60  # Seconds an idle connection is kept around for reuse
+DNS_CACHE_TTL = 300  # Seconds
+CONNECT_TIMEOUT = 10  # Seconds
+READ_TIMEOUT = 30  # Seconds between reads, so big downloads aren't cut off
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.total_latency = 0.0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    @property
+    def avg_latency(self):
+        return self.total_latency / self.requests if self.requests else 0.0
+
+class HttpClient:
+    """
+    Bot-wide HTTP client shared by every module through bot.http_client.
+
+    Wraps a single aiohttp session with a pooled keep-alive connector so
+    repeated requests to the same host (GitHub, CSULB, Discord's CDN) reuse
+    connections instead of doing a new TCP+TLS handshake each time. Must be
+    created inside the running event loop, e.g. in setup_hook.
+    """
+    def __init__(self):
+        self.stats = defaultdict(HostStats)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+            trace_configs=[trace_config],
+        )
+
+    def get(self, url, **kwargs):
+        """
+        Same as aiohttp.ClientSession.get, use it with `async with`.
+        """
+        return self.session.get(url, **kwargs)
+
+    async def close(self):
+        await self.session.close()
+
+    async def _on_request_start(self, session, context, params):
+        context.host = params.url.host
+        context.start = time.perf_counter()
+
+    async def _on_request_end(self, session, context, params):
+        host_stats = self.stats[context.host]
+        host_stats.requests += 1
+        host_stats.total_latency += time.perf_counter() - context.start
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats[context.host].new_connections += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats[context.host].reused_connections += 1
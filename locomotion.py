@@ -11,6 +11,18 @@ import os
 import json
 import re
 from scheduler import start_scheduler
+from user_store import open_user_store
+from http_client import HttpClient
+from github_client import GitHubClient
+from activity_ledger import ActivityLedger
+from message_index import MessageIndex
+from chart_renderer import ChartRenderer
+from chart_cache import ChartCache
+from name_resolver import NameResolver
+from ranking_index import RankingIndex
+from room_dataset import RoomTerms
+from room_scraper import PageParser
+from media_store import MediaStore
 
 # Load configuration from .env file 
 config = dotenv_values("../.locomotion-env")
@@ -22,8 +34,34 @@ intents.message_content = True
 # Discord bot token and target user ID
 TOKEN = config["DISCORD_TOKEN"]
 TARGET_USER_ID = int(config["TARGET_USER_ID"])
+USER_STORE_BACKEND = config.get("USER_STORE_BACKEND", "json")  # "json" or "sqlite"
+GITHUB_TOKEN = config.get("GITHUB_TOKEN")  # Optional, raises the GitHub rate limit
+CHART_CACHE_DIR = config.get("CHART_CACHE_DIR")  # Optional, keeps rendered charts across restarts
 
-bot = commands.Bot(command_prefix='!', intents=intents, activity=discord.Activity(type=discord.ActivityType.watching, name="github.com/MarkCarsonDev/Trainwreck-Autodeployment"))
+class Locomotion(commands.Bot):
+    async def close(self):
+        """
+        Flushes shared services before the bot disconnects.
+        """
+        if hasattr(self, 'user_store'):
+            await self.user_store.close()
+        if hasattr(self, 'chart_renderer'):
+            self.chart_renderer.close()
+        if hasattr(self, 'page_parser'):
+            self.page_parser.close()
+        if hasattr(self, 'message_index'):
+            await self.message_index.close()
+        if hasattr(self, 'media_store'):
+            await self.media_store.close()
+        if hasattr(self, 'activity_ledger'):
+            await self.activity_ledger.close()
+        if hasattr(self, 'github'):
+            await self.github.close()
+        if hasattr(self, 'http_client'):
+            await self.http_client.close()
+        await super().close()
+
+bot = Locomotion(command_prefix='!', intents=intents, activity=discord.Activity(type=discord.ActivityType.watching, name="github.com/MarkCarsonDev/Trainwreck-Autodeployment"))
 
 
 async def send_message(user_id: int, message=None):
@@ -52,6 +90,24 @@ async def setup_hook():
     """
     Asynchronous setup hook for the bot.
     """
+    # Shared services used by the modules. The chart renderer and page
+    # parser fork their workers, so they go first while the process is
+    # still single-threaded.
+    bot.chart_renderer = ChartRenderer()
+    await bot.chart_renderer.start()
+    bot.page_parser = PageParser()
+    await bot.page_parser.start()
+    bot.chart_cache = ChartCache(directory=CHART_CACHE_DIR)
+    bot.user_store = open_user_store(USER_STORE_BACKEND)
+    bot.rankings = RankingIndex(bot.user_store)
+    bot.http_client = HttpClient()
+    bot.github = GitHubClient(bot.http_client, token=GITHUB_TOKEN)
+    bot.activity_ledger = ActivityLedger().load()
+    bot.message_index = MessageIndex().load()
+    bot.media_store = MediaStore().load()
+    bot.names = NameResolver(bot)
+    bot.rooms = RoomTerms(bot.page_parser)
+
     modules_dir = os.path.join(os.path.dirname(__file__), 'modules')
     for filename in os.listdir(modules_dir):
         if filename.endswith('.py') and not filename.startswith('__'):
@@ -0,0 +1,204 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+MEDIA_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'media_store')
+MAX_ATTEMPTS = 5  # Dumps that try a failing download before giving up on it
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    channel_id INTEGER NOT NULL,
+    media_key TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (channel_id, media_key)
+);
+CREATE INDEX IF NOT EXISTS media_by_channel ON media (channel_id, message_id);
+CREATE TABLE IF NOT EXISTS media_failures (
+    channel_id INTEGER NOT NULL,
+    media_key TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    permanent INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, media_key)
+);
+CREATE TABLE IF NOT EXISTS dump_cursors (
+    channel_id INTEGER PRIMARY KEY,
+    last_message_id INTEGER NOT NULL
+);
+"""
+
+def media_key(url, attachment_id=None):
+    """
+    Returns what identifies a piece of media across dumps: the attachment
+    ID, or for embeds the URL without its (expiring) query string.
+    """
+    return str(attachment_id) if attachment_id is not None else url.split('?')[0]
+
+def link_or_copy(source, destination):
+    """
+    Hardlinks source to destination, copying instead across filesystems.
+    Leaves an existing destination alone.
+    """
+    if os.path.exists(destination):
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+class MediaStore:
+    """
+    Every piece of media !photodump has downloaded, available as
+    bot.media_store.
+
+    Files are stored once under their SHA-256 in objects/, so the same
+    image posted twice is kept once, and dump folders are hardlinks into
+    the store. An SQLite index maps each attachment to its content and
+    dump filename, and keeps a cursor per channel with the last message
+    whose media was all dealt with, so a dump only reads newer history and
+    an interrupted dump picks up where it stopped. Downloads that failed
+    are kept in their own table and retried by key in later dumps, until
+    they fail MAX_ATTEMPTS times or the file is known to be gone.
+    """
+    def __init__(self, directory=MEDIA_STORE_DIR):
+        self.directory = directory
+        self._db = None
+
+    def load(self):
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+        # Anything left in tmp/ is from a download that was cut off
+        shutil.rmtree(os.path.join(self.directory, 'tmp'), ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, 'tmp'))
+        self._db = sqlite3.connect(os.path.join(self.directory, 'media.db'))
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        return self
+
+    def object_path(self, sha256):
+        return os.path.join(self.directory, 'objects', sha256[:2], sha256)
+
+    def temp_path(self):
+        """
+        Returns a fresh path to download into, on the same filesystem as the
+        objects so storing it is a rename.
+        """
+        fd, path = tempfile.mkstemp(dir=os.path.join(self.directory, 'tmp'), suffix='.part')
+        os.close(fd)
+        return path
+
+    def has(self, channel_id, key):
+        """
+        Returns whether the media is already stored for a channel, with its
+        file intact.
+        """
+        row = self._db.execute('SELECT sha256 FROM media WHERE channel_id = ? AND media_key = ?', (channel_id, key)).fetchone()
+        return row is not None and os.path.exists(self.object_path(row[0]))
+
+    def store(self, temp_path, sha256):
+        """
+        Moves a finished download into objects/. If the same content is
+        already stored the download is just dropped. Does file work, so
+        callers on the event loop run it in a thread.
+        """
+        path = self.object_path(sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+
+    def record(self, key, channel_id, message_id, filename, sha256):
+        with self._db:
+            self._db.execute(
+                'INSERT INTO media (channel_id, media_key, message_id, filename, sha256) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (channel_id, media_key) DO UPDATE SET sha256 = excluded.sha256',
+                (channel_id, key, message_id, filename, sha256)
+            )
+            self._db.execute('DELETE FROM media_failures WHERE channel_id = ? AND media_key = ?', (channel_id, key))
+
+    def record_failure(self, channel_id, key, message_id, permanent=False):
+        """
+        Counts a failed download. Permanent failures (the file is gone) are
+        never retried.
+        """
+        with self._db:
+            self._db.execute(
+                'INSERT INTO media_failures (channel_id, media_key, message_id, attempts, permanent) VALUES (?, ?, ?, 1, ?) '
+                'ON CONFLICT (channel_id, media_key) DO UPDATE SET attempts = attempts + 1, '
+                'permanent = MAX(permanent, excluded.permanent)',
+                (channel_id, key, message_id, int(permanent))
+            )
+
+    def gave_up(self, channel_id, key):
+        """
+        Returns whether a download has failed for good.
+        """
+        row = self._db.execute(
+            'SELECT 1 FROM media_failures WHERE channel_id = ? AND media_key = ? AND (permanent OR attempts >= ?)',
+            (channel_id, key, MAX_ATTEMPTS)
+        ).fetchone()
+        return row is not None
+
+    def retries(self, channel_id):
+        """
+        Returns (media key, message ID) for every failed download in a
+        channel that's still worth another try.
+        """
+        return self._db.execute(
+            'SELECT media_key, message_id FROM media_failures '
+            'WHERE channel_id = ? AND NOT permanent AND attempts < ? ORDER BY message_id',
+            (channel_id, MAX_ATTEMPTS)
+        ).fetchall()
+
+    def forget(self, channel_id, keys):
+        """
+        Drops media whose stored file has gone missing and queues it to be
+        downloaded again, like a failure that hasn't used up any attempts.
+        """
+        with self._db:
+            for key in keys:
+                row = self._db.execute(
+                    'SELECT message_id FROM media WHERE channel_id = ? AND media_key = ?', (channel_id, key)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute('DELETE FROM media WHERE channel_id = ? AND media_key = ?', (channel_id, key))
+                    self._db.execute(
+                        'INSERT INTO media_failures (channel_id, media_key, message_id, attempts, permanent) VALUES (?, ?, ?, 0, 0) '
+                        'ON CONFLICT (channel_id, media_key) DO UPDATE SET attempts = 0, permanent = 0',
+                        (channel_id, key, row[0])
+                    )
+
+    def channel_media(self, channel_id):
+        """
+        Returns (media key, filename, object path) for every stored piece of
+        media from a channel, oldest first.
+        """
+        rows = self._db.execute(
+            'SELECT media_key, filename, sha256 FROM media WHERE channel_id = ? ORDER BY message_id', (channel_id,)
+        ).fetchall()
+        return [(key, filename, self.object_path(sha256)) for key, filename, sha256 in rows]
+
+    def cursor(self, channel_id):
+        """
+        Returns the last message ID in a channel whose media was all stored
+        or recorded as failed, or None if the channel was never dumped.
+        """
+        row = self._db.execute('SELECT last_message_id FROM dump_cursors WHERE channel_id = ?', (channel_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, channel_id, message_id):
+        with self._db:
+            self._db.execute(
+                'INSERT INTO dump_cursors (channel_id, last_message_id) VALUES (?, ?) '
+                'ON CONFLICT (channel_id) DO UPDATE SET last_message_id = excluded.last_message_id',
+                (channel_id, message_id)
+            )
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,258 @@
+import asyncio
+import os
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+import discord
+import numpy as np
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'message_index.db')
+FLUSH_DELAY = 5  # Seconds to wait for more messages before writing counts
+BACKFILL_DAYS = 365  # How far back the first backfill of a channel goes
+BACKFILL_BATCH = 500  # Messages between saved backfill checkpoints
+EPOCH = date(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_counts (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id, hour, channel_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS channel_cursors (
+    channel_id INTEGER PRIMARY KEY,
+    last_message_id INTEGER NOT NULL
+);
+"""
+
+def hour_of(moment):
+    """
+    Returns the number of whole hours between the Unix epoch and a datetime.
+    """
+    return int(moment.timestamp()) // 3600
+
+def day_of(moment):
+    """
+    Returns the number of whole UTC days between the Unix epoch and a date.
+    """
+    return (moment - EPOCH).days
+
+class MessageIndex:
+    """
+    Hourly message counts per user per channel, available as
+    bot.message_index.
+
+    Live messages are counted by the on_message/on_message_delete
+    listeners. History the bot missed (the first run, or while it was
+    offline) is filled in by a backfill that remembers the last message it
+    counted in each channel, so an interrupted backfill resumes where it
+    stopped. While a channel is being backfilled its live messages are
+    held back and only the ones the backfill didn't reach are counted once
+    it finishes, so nothing is counted twice or lost.
+    """
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self._db = None
+        self._pending_counts = {}
+        self._pending_cursors = {}
+        self._cursors = {}
+        self._caught_up = set()
+        self._held = {}  # channel_id -> {message_id: message} posted while it was being backfilled
+        self._backfill_started = False
+        self._flush_handle = None
+        # (guild_id, user_id) -> [first day number, np.int32 array of daily counts]
+        self._series = {}
+
+    def load(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._cursors = dict(self._db.execute('SELECT channel_id, last_message_id FROM channel_cursors'))
+        return self
+
+    def _count(self, guild_id, channel_id, user_id, created_at, delta):
+        key = (guild_id, user_id, hour_of(created_at), channel_id)
+        self._pending_counts[key] = self._pending_counts.get(key, 0) + delta
+
+        series = self._series.get((guild_id, user_id))
+        if series is not None:
+            index = self._extend(series, key[2] // 24)
+            series[1][index] = max(series[1][index] + delta, 0)
+
+    def _advance_cursor(self, channel_id, message_id):
+        self._cursors[channel_id] = message_id
+        self._pending_cursors[channel_id] = message_id
+
+    def record_message(self, message):
+        if message.guild is None:
+            return
+        channel_id = message.channel.id
+        if channel_id not in self._caught_up:
+            if channel_id in self._cursors or not self._backfill_started:
+                # The backfill may or may not have read past it yet
+                self._held.setdefault(channel_id, {})[message.id] = message
+                return
+            # A channel created after the backfill started has no history to catch up on
+            self._caught_up.add(channel_id)
+        self._count(message.guild.id, channel_id, message.author.id, message.created_at, 1)
+        self._advance_cursor(channel_id, max(message.id, self._cursors.get(channel_id, 0)))
+        self._schedule_flush()
+
+    def record_delete(self, message):
+        if message.guild is None:
+            return
+        if self._held.get(message.channel.id, {}).pop(message.id, None) is not None:
+            return
+        # Only messages we already counted can be taken back out
+        if message.id > self._cursors.get(message.channel.id, 0):
+            return
+        self._count(message.guild.id, message.channel.id, message.author.id, message.created_at, -1)
+        self._schedule_flush()
+
+    async def backfill(self, guilds):
+        """
+        Counts every message the index hasn't seen yet in the guilds' text
+        channels, oldest first, saving a checkpoint every BACKFILL_BATCH
+        messages.
+        """
+        channels = [channel for guild in guilds for channel in guild.text_channels]
+        self._caught_up.clear()
+        window_start = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(days=BACKFILL_DAYS))
+        for channel in channels:
+            if channel.id not in self._cursors:
+                self._advance_cursor(channel.id, window_start)
+        self._backfill_started = True
+
+        for channel in channels:
+            after = discord.Object(id=self._cursors[channel.id])
+            counted = 0
+            try:
+                async for message in channel.history(limit=None, after=after, oldest_first=True):
+                    self._count(channel.guild.id, channel.id, message.author.id, message.created_at, 1)
+                    self._advance_cursor(channel.id, message.id)
+                    counted += 1
+                    if counted % BACKFILL_BATCH == 0:
+                        self.flush()
+            except (discord.Forbidden, discord.HTTPException):
+                pass
+            # Nothing can arrive between the last history page and marking the channel caught up
+            for message_id, message in sorted(self._held.pop(channel.id, {}).items()):
+                if message_id > self._cursors[channel.id]:
+                    self._count(channel.guild.id, channel.id, message.author.id, message.created_at, 1)
+                    self._advance_cursor(channel.id, message_id)
+                    counted += 1
+            self.flush()
+            self._caught_up.add(channel.id)
+            if counted:
+                print(f"Indexed {counted} messages in #{channel.name}")
+
+    def is_caught_up(self, guild):
+        return all(channel.id in self._caught_up for channel in guild.text_channels)
+
+    @staticmethod
+    def _extend(series, day_number):
+        """
+        Grows a cached series so it covers day_number and returns its index.
+        """
+        first_day, counts = series
+        if day_number < first_day:
+            series[0], series[1] = day_number, np.concatenate((np.zeros(first_day - day_number, dtype=np.int32), counts))
+        elif day_number >= first_day + len(counts):
+            series[1] = np.concatenate((counts, np.zeros(day_number - first_day - len(counts) + 1, dtype=np.int32)))
+        return day_number - series[0]
+
+    def _daily_series(self, guild_id, user_id):
+        """
+        Returns the user's cached [first day, daily counts], loading it from
+        the database the first time it's asked for.
+        """
+        key = (guild_id, user_id)
+        if key not in self._series:
+            self.flush()
+            rows = np.array(self._db.execute(
+                'SELECT hour / 24, SUM(count) FROM message_counts '
+                'WHERE guild_id = ? AND user_id = ? GROUP BY hour / 24',
+                key
+            ).fetchall(), dtype=np.int64).reshape(-1, 2)
+            first_day = int(rows[:, 0].min()) if len(rows) else day_of(datetime.now(timezone.utc).date())
+            counts = np.zeros(int(rows[:, 0].max()) - first_day + 1 if len(rows) else 1, dtype=np.int32)
+            counts[rows[:, 0] - first_day] = rows[:, 1]
+            self._series[key] = [first_day, counts]
+        return self._series[key]
+
+    def _window(self, guild_id, user_id, first_day, last_day):
+        """
+        Returns daily counts for [first_day, last_day], zero where there's no data.
+        """
+        series_start, counts = self._daily_series(guild_id, user_id)
+        window = np.zeros(last_day - first_day + 1, dtype=np.int32)
+        start, end = max(first_day, series_start), min(last_day, series_start + len(counts) - 1)
+        if start <= end:
+            window[start - first_day:end - first_day + 1] = counts[start - series_start:end - series_start + 1]
+        return window
+
+    def activity(self, guild_id, user_id, unit='day', periods=30):
+        """
+        Returns (period_starts, counts) for the user's messages over the last
+        `periods` days, weeks or months (UTC), oldest first. Weeks are 7-day
+        blocks ending today and months are calendar months.
+        """
+        today = datetime.now(timezone.utc).date()
+        last_day = day_of(today)
+
+        if unit == 'day':
+            counts = self._window(guild_id, user_id, last_day - periods + 1, last_day)
+            starts = [today - timedelta(days=i) for i in reversed(range(periods))]
+        elif unit == 'week':
+            counts = self._window(guild_id, user_id, last_day - periods * 7 + 1, last_day).reshape(periods, 7).sum(axis=1)
+            starts = [today - timedelta(days=i * 7 + 6) for i in reversed(range(periods))]
+        elif unit == 'month':
+            month_index = today.year * 12 + today.month - 1
+            starts = [date(index // 12, index % 12 + 1, 1) for index in range(month_index - periods + 1, month_index + 1)]
+            offsets = np.array([(start - starts[0]).days for start in starts])
+            counts = np.add.reduceat(self._window(guild_id, user_id, day_of(starts[0]), last_day), offsets)
+        else:
+            raise ValueError(f"Unknown activity unit: {unit}")
+
+        return starts, counts
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        """
+        Writes pending counts and channel cursors in one transaction.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending_counts and not self._pending_cursors:
+            return
+
+        with self._db:
+            self._db.executemany(
+                'INSERT INTO message_counts (guild_id, user_id, hour, channel_id, count) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (guild_id, user_id, hour, channel_id) DO UPDATE SET count = count + excluded.count',
+                [key + (delta,) for key, delta in self._pending_counts.items() if delta > 0]
+            )
+            self._db.executemany(
+                'UPDATE message_counts SET count = MAX(count + ?, 0) '
+                'WHERE guild_id = ? AND user_id = ? AND hour = ? AND channel_id = ?',
+                [(delta,) + key for key, delta in self._pending_counts.items() if delta < 0]
+            )
+            self._db.executemany(
+                'INSERT INTO channel_cursors (channel_id, last_message_id) VALUES (?, ?) '
+                'ON CONFLICT (channel_id) DO UPDATE SET last_message_id = excluded.last_message_id',
+                list(self._pending_cursors.items())
+            )
+        self._pending_counts.clear()
+        self._pending_cursors.clear()
+
+    async def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
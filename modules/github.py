@@ -1,16 +1,13 @@
-import aiohttp
 from discord.ext import commands
+from github_client import GitHubError
 
-async def fetch_latest_commit_date(username):
-    url = f'https://api.github.com/users/{username}/events'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                return None
-            events = await response.json()
-            for event in events:
-                if event['type'] == 'PushEvent':
-                    return event['created_at']
+async def fetch_latest_commit_date(github, username):
+    try:
+        async for event in github.iter_events(username):
+            if event['type'] == 'PushEvent':
+                return event['created_at']
+    except GitHubError:
+        return None
     return None
 
 @commands.command()
@@ -18,7 +15,8 @@ async def finduser(ctx, username):
     """
     Fetches and displays the date of the most recent commit for a given GitHub username.
     """
-    commit_date = await fetch_latest_commit_date(username)
+    # Tracked users are answered from the local activity ledger
+    commit_date = ctx.bot.activity_ledger.latest_push(username) or await fetch_latest_commit_date(ctx.bot.github, username)
     if commit_date:
         await ctx.reply(f"The most recent commit by {username} was on {commit_date}.")
     else:
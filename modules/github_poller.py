@@ -0,0 +1,25 @@
+from scheduler import schedule
+from fanout import gather_bounded, describe_failure
+
+POLL_CONCURRENCY = 4  # GitHub requests in flight at once
+POLL_TIMEOUT = 60  # Seconds per user before giving up on them until the next poll
+
+@schedule("0 * * * *")  # Every hour
+async def scheduled_activity_poll(bot):
+    """
+    Tops up the activity ledger for every tracked GitHub user, so the
+    weekly praise and shame runs only have to catch up the last hour.
+    """
+    github_usernames = sorted({info['github_username'] for info in bot.user_store.all().values() if 'github_username' in info})
+    results = await gather_bounded(
+        github_usernames,
+        lambda github_username: bot.activity_ledger.sync_user(bot.github, github_username),
+        concurrency=POLL_CONCURRENCY,
+        timeout=POLL_TIMEOUT
+    )
+    for github_username, result in zip(github_usernames, results):
+        if isinstance(result, Exception):
+            print(f"Could not poll GitHub activity for {github_username}: {describe_failure(result)}")
+
+def setup(bot):
+    scheduled_activity_poll.start_task(bot)
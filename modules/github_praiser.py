@@ -1,60 +1,27 @@
-import aiohttp
-import json
 from discord.ext import commands
 from scheduler import schedule
-from datetime import datetime, timedelta
+from fanout import gather_bounded, describe_failure
+from name_resolver import mention
 import discord
 import random
 import copy
 
 PRAISE_CHANNEL_ID = 1082164945438916679  # Same as shame channel for now
+FETCH_CONCURRENCY = 8  # GitHub requests in flight at once
+FETCH_TIMEOUT = 20  # Seconds per user before giving up on them
 
-# Load and save user info
-def load_user_info():
-    try:
-        with open('../user_info.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_user_info(data):
-    with open('../user_info.json', 'w') as file:
-        json.dump(data, file, indent=4)
-
-async def fetch_commits_in_last_week(username):
+async def fetch_commits_in_last_week(ledger, github, username):
     """
-    Fetches commit data for a GitHub user in the last week.
+    Catches the activity ledger up for a GitHub user and returns their
+    commits over the last week.
     
     Returns tuple of (total_commits, daily_commits) where
-    daily_commits is a dict mapping days to commit counts
+    daily_commits is a dict mapping days to commit counts.
+    Raises GitHubError if GitHub couldn't be reached.
     """
-    one_week_ago = datetime.now() - timedelta(days=7)
-    url = f'https://api.github.com/users/{username}/events'
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                return 0, {}
-                
-            events = await response.json()
-            commit_count = 0
-            daily_commits = {}
-            
-            # Initialize daily_commits with all days of the week
-            for i in range(7):
-                day = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-                daily_commits[day] = 0
-            
-            for event in events:
-                if event['type'] == 'PushEvent':
-                    event_time = datetime.strptime(event['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-                    if event_time > one_week_ago:
-                        commit_count += 1
-                        day = event_time.strftime('%Y-%m-%d')
-                        if day in daily_commits:
-                            daily_commits[day] += 1
-            
-            return commit_count, daily_commits
+    await ledger.sync_user(github, username)
+    daily_commits = ledger.daily_commits(username)
+    return sum(daily_commits.values()), daily_commits
 
 def calculate_points(commits, daily_commits, user_info):
     """Calculate points based on commits, streaks, and bonuses"""
@@ -119,13 +86,32 @@ async def generate_praise_embed(ctx, user_info, update_data=True):
         Either an embed or a string message
     """
     praise_messages = []
-    # Make a deep copy to avoid modifying the original if we're not updating
-    working_info = user_info if update_data else copy.deepcopy(user_info)
+    # Work on a copy; changes are written back through the user store below
+    working_info = copy.deepcopy(user_info)
+    updated_ids = []
+    failed_users = []
+    
+    # Fetch everyone at once; points are still applied in user order below
+    tracked = [discord_id for discord_id, info in working_info.items() if 'github_username' in info]
+    results = await gather_bounded(
+        [working_info[discord_id]['github_username'] for discord_id in tracked],
+        lambda github_username: fetch_commits_in_last_week(ctx.bot.activity_ledger, ctx.bot.github, github_username),
+        concurrency=FETCH_CONCURRENCY,
+        timeout=FETCH_TIMEOUT
+    )
+    commit_results = dict(zip(tracked, results))
     
     for discord_id, info in working_info.items():
         if 'github_username' in info:
             github_username = info['github_username']
-            commits, daily_commits = await fetch_commits_in_last_week(github_username)
+            result = commit_results[discord_id]
+            
+            # Leave users we couldn't reach untouched rather than guessing
+            if isinstance(result, Exception):
+                print(f"Could not fetch commits for {github_username}: {describe_failure(result)}")
+                failed_users.append(github_username)
+                continue
+            commits, daily_commits = result
             
             # Initialize points if not exists
             if 'points' not in info:
@@ -143,23 +129,21 @@ async def generate_praise_embed(ctx, user_info, update_data=True):
             if update_data:
                 working_info[discord_id]['points'] = info.get('points', 0) + points
                 working_info = update_streak(discord_id, commits, working_info)
+                updated_ids.append(discord_id)
             
-            # Get user mention
-            try:
-                user = await ctx.bot.fetch_user(int(discord_id))
-                user_mention = user.mention
-                
-                # Generate praise message
-                if commits > 0:
-                    next_streak = streak_weeks + 1 if commits > 0 else 0
-                    message = f"{user_mention}: " + get_praise_message(commits, points, next_streak)
-                    praise_messages.append(message)
-            except:
-                continue
+            # Generate praise message
+            if commits > 0:
+                next_streak = streak_weeks + 1 if commits > 0 else 0
+                message = f"{mention(discord_id)}: " + get_praise_message(commits, points, next_streak)
+                praise_messages.append(message)
     
     # Save updated user info ONLY if we are updating
     if update_data:
-        save_user_info(working_info)
+        for discord_id in updated_ids:
+            ctx.bot.user_store.update(discord_id, {
+                'points': working_info[discord_id]['points'],
+                'streak_weeks': working_info[discord_id]['streak_weeks'],
+            })
     
     if praise_messages:
         embed = discord.Embed(
@@ -169,9 +153,15 @@ async def generate_praise_embed(ctx, user_info, update_data=True):
         )
         
         embed.add_field(name="Top Contributors", value="\n".join(praise_messages), inline=False)
+        if failed_users:
+            embed.add_field(name="Couldn't Check", value=", ".join(failed_users), inline=False)
         embed.set_footer(text="Next evaluation in one week. Keep it up, superstars.")
         
         return embed
+    elif failed_users and len(failed_users) == len(tracked):
+        return f"Couldn't check GitHub activity for anyone this week ({', '.join(failed_users)}). Try again later."
+    elif failed_users:
+        return f"No GitHub activity found for anyone I could check this week. You all disappoint me.\nCouldn't check: {', '.join(failed_users)}"
     else:
         return "No GitHub activity found for any users this week. You all disappoint me."
 
@@ -180,7 +170,7 @@ async def praise(ctx):
     """
     Praises users for their GitHub commits and awards points.
     """
-    user_info = load_user_info()
+    user_info = ctx.bot.user_store.all()
     praise_result = await generate_praise_embed(ctx, user_info, update_data=True)
     
     if isinstance(praise_result, discord.Embed):
@@ -193,7 +183,7 @@ async def testpraise(ctx):
     """
     Tests the praise functionality in the current channel without updating points.
     """
-    user_info = load_user_info()
+    user_info = ctx.bot.user_store.all()
     praise_result = await generate_praise_embed(ctx, user_info, update_data=False)
     
     if isinstance(praise_result, discord.Embed):
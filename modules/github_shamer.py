@@ -1,40 +1,19 @@
-import aiohttp
 import json
 from discord.ext import commands
 from scheduler import schedule
+from fanout import gather_bounded, describe_failure
+from name_resolver import mention
 from datetime import datetime, timedelta
 import discord
 import random
 
 SHAME_CHANNEL_ID = 1082164945438916679
+FETCH_CONCURRENCY = 8  # GitHub requests in flight at once
+FETCH_TIMEOUT = 20  # Seconds per user before giving up on them
 
-# Load and save user info
-def load_user_info():
-    try:
-        with open('../user_info.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_user_info(data):
-    with open('../user_info.json', 'w') as file:
-        json.dump(data, file, indent=4)
-
-async def fetch_commits_in_last_week(username):
-    one_week_ago = datetime.now() - timedelta(days=7)
-    url = f'https://api.github.com/users/{username}/events'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                return None
-            events = await response.json()
-            commit_count = 0
-            for event in events:
-                if event['type'] == 'PushEvent':
-                    event_time = datetime.strptime(event['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-                    if event_time > one_week_ago:
-                        commit_count += 1
-            return commit_count
+async def fetch_commits_in_last_week(ledger, github, username):
+    await ledger.sync_user(github, username)
+    return sum(ledger.daily_commits(username).values())
         
 def get_shame_message():
     messages = [
@@ -48,33 +27,41 @@ async def generate_shame_result(ctx, user_info, update_counts=False):
     one_week_ago = datetime.now() - timedelta(days=7)
     min_commits = float('inf')
     worst_users = []
-
-    for discord_id, info in user_info.items():
-        if 'github_username' in info:
-            github_username = info['github_username']
-            commit_count = await fetch_commits_in_last_week(github_username)
-            
-            if commit_count is not None and commit_count <= min_commits:
-                if commit_count < min_commits:
-                    worst_users = []
-                worst_users.append((discord_id, github_username))
-                min_commits = commit_count
+    failed_users = []
+
+    # Fetch everyone at once, then walk the results in user order so ties come out the same
+    tracked = [(discord_id, info['github_username']) for discord_id, info in user_info.items() if 'github_username' in info]
+    commit_counts = await gather_bounded(
+        [github_username for _, github_username in tracked],
+        lambda github_username: fetch_commits_in_last_week(ctx.bot.activity_ledger, ctx.bot.github, github_username),
+        concurrency=FETCH_CONCURRENCY,
+        timeout=FETCH_TIMEOUT
+    )
+
+    for (discord_id, github_username), commit_count in zip(tracked, commit_counts):
+        if isinstance(commit_count, Exception):
+            print(f"Could not fetch commits for {github_username}: {describe_failure(commit_count)}")
+            failed_users.append(github_username)
+            continue
+
+        if commit_count is not None and commit_count <= min_commits:
+            if commit_count < min_commits:
+                worst_users = []
+            worst_users.append((discord_id, github_username))
+            min_commits = commit_count
 
     if worst_users:
         if update_counts:
             for discord_id, _ in worst_users:
                 if discord_id in user_info:
-                    if 'shame_count' not in user_info[discord_id]:
-                        user_info[discord_id]['shame_count'] = 0
-                    user_info[discord_id]['shame_count'] += 1
-            save_user_info(user_info)
+                    shame_count = user_info[discord_id].get('shame_count', 0) + 1
+                    ctx.bot.user_store.update(discord_id, {'shame_count': shame_count})
 
-        mentions = [await ctx.bot.fetch_user(int(user[0])) for user in worst_users]
         shame_message = get_shame_message()
 
         embed = discord.Embed(
             title="🔔 SHAME ALERT 🔔",
-            description=f"{', '.join([mention.mention for mention in mentions])}",
+            description=', '.join(mention(discord_id) for discord_id, _ in worst_users),
             color=discord.Color.red()
         )
 
@@ -84,8 +71,19 @@ async def generate_shame_result(ctx, user_info, update_counts=False):
             inline=False
         )
 
+        if failed_users:
+            embed.add_field(
+                name="Couldn't Check",
+                value=", ".join(failed_users),
+                inline=False
+            )
+
         embed.set_footer(text="Do better next week! The GitHub gods are watching...")
         return embed
+    elif failed_users and len(failed_users) == len(tracked):
+        return f"Couldn't check GitHub activity for anyone this week ({', '.join(failed_users)}), so nobody gets shamed. Try again later."
+    elif failed_users:
+        return f"No users to shame this week. Everyone's doing great!\nCouldn't check: {', '.join(failed_users)}"
     else:
         return "No users to shame this week. Everyone's doing great!"
 
@@ -96,7 +94,7 @@ async def shame(ctx):
     """
     Finds and shames the user with the least commits in the last week.
     """
-    user_info = load_user_info()
+    user_info = ctx.bot.user_store.all()
     shame_result = await generate_shame_result(ctx, user_info, update_counts=True)
     
     if isinstance(shame_result, discord.Embed):
@@ -109,7 +107,7 @@ async def testshame(ctx):
     """
     Tests the shame functionality in the current channel without updating shame counts.
     """
-    user_info = load_user_info()
+    user_info = ctx.bot.user_store.all()
     # Create a copy to avoid modifying real data
     test_info = json.loads(json.dumps(user_info))
     
@@ -124,7 +122,7 @@ async def testshame(ctx):
 async def scheduled_shame_task(bot):
     channel = bot.get_channel(SHAME_CHANNEL_ID)
     if channel:
-        user_info = load_user_info()
+        user_info = bot.user_store.all()
         ctx = await bot.get_context(await channel.send("Starting weekly shame task..."))
         shame_result = await generate_shame_result(ctx, user_info, update_counts=True)
         if isinstance(shame_result, discord.Embed):
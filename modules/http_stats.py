@@ -0,0 +1,23 @@
+from discord.ext import commands
+
+@commands.command()
+async def httpstats(ctx):
+    """
+    Shows per-host latency and connection reuse for outbound HTTP requests.
+    """
+    stats = ctx.bot.http_client.stats
+    if not stats:
+        await ctx.reply("No outbound HTTP requests have been made yet.")
+        return
+
+    lines = []
+    for host, host_stats in sorted(stats.items(), key=lambda item: item[1].requests, reverse=True):
+        lines.append(
+            f"{host}: {host_stats.requests} requests, "
+            f"avg {host_stats.avg_latency * 1000:.0f} ms, "
+            f"{host_stats.new_connections} new / {host_stats.reused_connections} reused connections"
+        )
+    await ctx.reply("```\n" + "\n".join(lines) + "\n```")
+
+def setup(bot):
+    bot.add_command(httpstats)
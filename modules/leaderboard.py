@@ -1,200 +1,205 @@
-import json
 import discord
 from discord.ext import commands
-import matplotlib.pyplot as plt
 import io
 from datetime import datetime
 import os
+from chart_cache import chart_key
+from chart_renderer import THEME
 
-# Load user information from JSON file
-def load_user_info():
-    try:
-        with open('../user_info.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
+PAGE_SIZE = 10  # Rows per leaderboard page
+VIEW_TIMEOUT = 300  # Seconds the page buttons keep working
+CHART_LIMIT = 10  # Rows the chart samples from when no number is given
 
-async def generate_leaderboard_chart(ctx, user_entries, sort_field, title_text, limit):
+async def generate_leaderboard_chart(ctx, rows, sort_field, title_text, limit):
     """Generates a bar chart visualization for the leaderboard"""
-    # Create a bar chart of the top users
-    plt.figure(figsize=(10, 6))
-    
     # Get top 8 or fewer users for better readability in the chart
     # Even if the user requests more in the leaderboard text
-    # chart_entries = user_entries[:min(8, len(user_entries))]
+    # chart_entries = rows[:min(8, len(rows))]
 
     # Get 8 or fewer for the chart, but if an argument for number is given, use the top 4 total and bottom 4 until that point limit
-    chart_entries = user_entries[:min(4, len(user_entries))]
-    chart_entries += user_entries[max(limit-4, 4):min(len(user_entries), limit)]
+    chart_entries = rows[:min(4, len(rows))]
+    chart_entries += rows[max(limit-4, 4):min(len(rows), limit)]
     chart_entries = chart_entries[:8]  # Limit to 8 entries for the chart
     
     # Get usernames and values
     usernames = []
     values = []
     
-    for entry in chart_entries:
-        try:
-            user = await ctx.bot.fetch_user(int(entry['id']))
-            usernames.append(user.display_name)
-            values.append(entry[sort_field])
-        except:
-            continue
-    
-    # Generate bar chart with custom colors
-    colors = ['#5865F2', '#57F287', '#FEE75C', '#EB459E', '#ED4245', '#9B59B6', '#3498DB', '#2ECC71']
-    plt.bar(range(len(usernames)), values, color=colors[:len(usernames)])
-    plt.xticks(range(len(usernames)), usernames, rotation=45, ha='right')
-    plt.title(f"{title_text}")
-    plt.ylabel(sort_field.replace('_', ' ').title())
-    plt.tight_layout()
-    
-    # Set background color to match Discord dark theme
-    plt.gca().set_facecolor('#36393F')
-    plt.gcf().set_facecolor('#36393F')
+    names = await ctx.bot.names.display_names([row.user_id for row in chart_entries], ctx.guild)
+    for row in chart_entries:
+        if int(row.user_id) in names:
+            usernames.append(names[int(row.user_id)])
+            values.append(getattr(row, sort_field))
     
-    # Set text color to white
-    plt.gca().xaxis.label.set_color('white')
-    plt.gca().yaxis.label.set_color('white')
-    plt.gca().title.set_color('white')
-    plt.gca().tick_params(axis='x', colors='white')
-    plt.gca().tick_params(axis='y', colors='white')
-    
-    # Add value labels on top of each bar
-    for i, v in enumerate(values):
-        plt.text(i, v + max(values)*0.03, str(v), color='white', ha='center')
+    # Reuse the last render if none of the inputs changed. Names are
+    # nicknames, so they differ per guild and have to be part of the key.
+    cache_key = chart_key(
+        'leaderboard', ctx.guild.id if ctx.guild else None, usernames, values, sort_field, title_text, limit, THEME
+    )
+    png = ctx.bot.chart_cache.get(cache_key)
+    if png is not None:
+        return discord.File(io.BytesIO(png), filename="leaderboard.png")
     
-    # Save to bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', facecolor='#36393F')
-    buf.seek(0)
-    plt.close()
+    # Render the bar chart off the event loop
+    png = await ctx.bot.chart_renderer.bar_chart(usernames, values, title_text, sort_field.replace('_', ' ').title())
+    # A chart missing someone whose name couldn't be looked up isn't worth keeping
+    if len(usernames) == len(chart_entries):
+        ctx.bot.chart_cache.put(cache_key, png, tag='leaderboard')
     
-    return discord.File(buf, filename="leaderboard.png")
+    return discord.File(io.BytesIO(png), filename="leaderboard.png")
+
+class LeaderboardView(discord.ui.View):
+    """
+    Pages through a ranking snapshot with buttons. The snapshot never
+    changes, so flipping pages only resolves the names on the new page.
+    """
+    def __init__(self, ctx, rows, title, description, sort_field, sort_emoji, stats_text):
+        super().__init__(timeout=VIEW_TIMEOUT)
+        self.ctx = ctx
+        self.rows = rows
+        self.title = title
+        self.description = description
+        self.sort_field = sort_field
+        self.sort_emoji = sort_emoji
+        self.stats_text = stats_text
+        self.page = 0
+        self.page_count = max(1, (len(rows) + PAGE_SIZE - 1) // PAGE_SIZE)
+        self.message = None
+
+    async def render(self):
+        """
+        Builds the embed for the current page and updates the buttons.
+        """
+        page_rows = self.rows[self.page * PAGE_SIZE:(self.page + 1) * PAGE_SIZE]
+        names = await self.ctx.bot.names.display_names([row.user_id for row in page_rows], self.ctx.guild)
+        
+        # Generate the leaderboard entries
+        leaderboard_text = []
+        for row in page_rows:
+            username = names.get(int(row.user_id))
+            info = self.ctx.bot.user_store.get(row.user_id)
+            if username is None or info is None:
+                print(f"Error processing user {row.user_id}: not found")
+                continue
+            
+            # Create rank emoji
+            rank_emoji = "🥇" if row.rank == 1 else "🥈" if row.rank == 2 else "🥉" if row.rank == 3 else f"{row.rank}."
+            multiplier = round(1.2 ** row.streak_weeks, 2)
+            
+            # Create leaderboard entry
+            leaderboard_text.append(
+                f"{rank_emoji} **{username}** [@{info.get('github_username')}]\n"
+                f"   {self.sort_emoji} **{getattr(row, self.sort_field)}** | "
+                f"🔥 Streak: {row.streak_weeks} (x{multiplier}) | "
+                f"😱 Shame: {row.shame_count}"
+            )
+        
+        # Rows go in the description, which holds far more than a field's 1024 characters
+        embed = discord.Embed(
+            title=self.title,
+            description=self.description + "\n\n" + "\n\n".join(leaderboard_text),
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="Stats Overview", value=self.stats_text, inline=False)
+        embed.set_footer(text=f"Page {self.page + 1}/{self.page_count} • Use !leaderboard [quantity] • Last updated: {discord.utils.format_dt(datetime.now(), 'R')}")
+        embed.set_image(url="attachment://leaderboard.png")
+        
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+        return embed
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Run `!leaderboard` to get your own copy to page through.", ephemeral=True)
+            return False
+        return True
+
+    async def show_page(self, interaction, page):
+        self.page = min(max(page, 0), self.page_count - 1)
+        # Resolving names can outlast Discord's 3 seconds to answer an interaction
+        await interaction.response.defer()
+        await interaction.edit_original_response(embed=await self.render(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self.show_page(interaction, self.page + 1)
+
+    @discord.ui.button(label="Jump to me", style=discord.ButtonStyle.primary)
+    async def jump_to_me(self, interaction, button):
+        for index, row in enumerate(self.rows):
+            if row.user_id == str(interaction.user.id):
+                await self.show_page(interaction, index // PAGE_SIZE)
+                return
+        await interaction.response.send_message("You're not on this leaderboard.", ephemeral=True)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
 
 @commands.command()
-async def leaderboard(ctx, limit="10"):
+async def leaderboard(ctx, limit=None):
     """
-    Shows the leaderboard ranking users by points.
+    Shows the leaderboard ranking users by points, a page at a time.
     Usage: !leaderboard [number]
     Example: !leaderboard 20 - Shows top 20 users
     """
     # Check if the argument is a number
-    if not limit.isdigit():
-        await ctx.reply(f"Invalid argument. Please provide a number (e.g., !leaderboard 20)")
+    if limit is not None and (not limit.isdigit() or int(limit) == 0):
+        await ctx.reply(f"Invalid argument. Please provide a number of at least 1 (e.g., !leaderboard 20)")
+        return
+    
+    title = "🏆 Points Leaderboard"
+    description = "Who's putting in commits?"
+    sort_field = "points"
+    sort_emoji = "🏆"
+    
+    # The snapshot is shared until the next points change, so this is free
+    rows = ctx.bot.rankings.snapshot(sort_field)
+    if limit is not None:
+        rows = rows[:int(limit)]
+    
+    if not rows:
+        embed = discord.Embed(title=title, description=description, color=discord.Color.gold())
+        embed.add_field(
+            name="No Data",
+            value="No users found with GitHub usernames set up.",
+            inline=False
+        )
+        await ctx.send(embed=embed)
         return
-        
-    limit = int(limit)
-    user_info = load_user_info()
     
     # Send a loading message first
     loading_message = await ctx.reply(f"{ctx.author.mention} I'm generating the leaderboard... One moment please.")
     
     try:
-        # Convert user_info dict to a list of entries for sorting
-        user_entries = []
-        
-        for user_id, data in user_info.items():
-            # Skip users without GitHub usernames
-            if 'github_username' not in data:
-                continue
-                
-            # Add entry with all relevant data
-            entry = {
-                'id': user_id,
-                'github_username': data['github_username'],
-                'points': data.get('points', 0),
-                'streak_weeks': data.get('streak_weeks', 0),
-                'shame_count': data.get('shame_count', 0),
-                'multiplier': round(1.2 ** data.get('streak_weeks', 0), 2)
-            }
-            
-            user_entries.append(entry)
-        
-        # Sort based on category
-        user_entries.sort(key=lambda x: x['points'], reverse=True)
-        title = "🏆 Points Leaderboard"
-        description = "Who's putting in commits?"
-        sort_field = "points"
-        sort_emoji = "🏆"
-        
-        # Generate leaderboard embed
-        embed = discord.Embed(
-            title=title,
-            description=description,
-            color=discord.Color.gold()
+        # Stats cover everyone tracked, not just the rows shown
+        everyone = ctx.bot.rankings.snapshot(sort_field)
+        stats_text = (
+            f"Total Points: **{sum(row.points for row in everyone)}**\n"
+            f"Average Streak: **{round(sum(row.streak_weeks for row in everyone) / len(everyone), 1)}** weeks\n"
+            f"Total Shame Count: **{sum(row.shame_count for row in everyone)}**\n"
+            f"Users Tracked: **{len(everyone)}**"
         )
         
-        # Generate the leaderboard entries
-        leaderboard_text = []
+        # Generate and attach the bar chart, which stays put while paging
+        chart_limit = int(limit) if limit is not None else CHART_LIMIT
+        chart_file = await generate_leaderboard_chart(ctx, rows, sort_field, title, chart_limit)
         
-        for i, entry in enumerate(user_entries[:limit]):  # Use limit parameter
-            try:
-                # Fetch Discord user
-                user = await ctx.bot.fetch_user(int(entry['id']))
-                username = user.display_name
-                
-                # Create rank emoji
-                rank_emoji = "🥇" if i == 0 else "🥈" if i == 1 else "🥉" if i == 2 else f"{i+1}."
-                
-                # Create leaderboard entry
-                entry_text = (
-                    f"{rank_emoji} **{username}** [@{entry['github_username']}]\n"
-                    f"   {sort_emoji} **{entry[sort_field]}** | "
-                    f"🔥 Streak: {entry['streak_weeks']} (x{entry['multiplier']}) | "
-                    f"😱 Shame: {entry['shame_count']}"
-                )
-                
-                leaderboard_text.append(entry_text)
-            except Exception as e:
-                print(f"Error processing user {entry['id']}: {str(e)}")
-        
-        if leaderboard_text:
-            embed.add_field(
-                name="Rankings",
-                value="\n\n".join(leaderboard_text),
-                inline=False
-            )
-        else:
-            embed.add_field(
-                name="No Data",
-                value="No users found with GitHub usernames set up.",
-                inline=False
-            )
-            
-        # Add statistics field
-        if len(user_entries) > 0:
-            total_points = sum(entry['points'] for entry in user_entries)
-            total_shame = sum(entry['shame_count'] for entry in user_entries)
-            avg_streak = round(sum(entry['streak_weeks'] for entry in user_entries) / len(user_entries), 1)
-            
-            stats_text = (
-                f"Total Points: **{total_points}**\n"
-                f"Average Streak: **{avg_streak}** weeks\n"
-                f"Total Shame Count: **{total_shame}**\n"
-                f"Users Tracked: **{len(user_entries)}**"
-            )
-            
-            embed.add_field(
-                name="Stats Overview",
-                value=stats_text,
-                inline=False
-            )
-            
-        # Add footer
-        embed.set_footer(text=f"Use !leaderboard [quantity] • Last updated: {discord.utils.format_dt(datetime.now(), 'R')}")
+        view = LeaderboardView(ctx, rows, title, description, sort_field, sort_emoji, stats_text)
+        embed = await view.render()
         
-        # Generate and attach bar chart if we have entries
-        if len(user_entries) > 0:
-            chart_file = await generate_leaderboard_chart(ctx, user_entries, sort_field, title, limit)
-            embed.set_image(url="attachment://leaderboard.png")
-            
-            # Delete the loading message and send the leaderboard with chart
-            await loading_message.delete()
-            await ctx.send(file=chart_file, embed=embed)
-        else:
-            # No entries, just send the embed
-            await loading_message.delete()
-            await ctx.send(embed=embed)
+        # Delete the loading message and send the leaderboard with chart
+        await loading_message.delete()
+        view.message = await ctx.send(file=chart_file, embed=embed, view=view)
             
     except Exception as e:
         # If something goes wrong, edit the loading message to show the error
@@ -208,44 +213,28 @@ async def rank(ctx, member: discord.Member = None):
     if member is None:
         member = ctx.author
     
-    user_info = load_user_info()
-    user_id = str(member.id)
+    user_data = ctx.bot.user_store.get(member.id)
+    rankings = ctx.bot.rankings
     
-    if user_id not in user_info or 'github_username' not in user_info[user_id]:
+    if user_data is None or 'github_username' not in user_data:
         await ctx.reply(f"{member.display_name} doesn't have a profile yet. They should set up with `!setupuser <github_username>`")
         return
     
     # Get user's data
-    user_data = user_info[user_id]
     user_points = user_data.get('points', 0)
     user_streak = user_data.get('streak_weeks', 0)
     user_shame = user_data.get('shame_count', 0)
     streak_multiplier = round(1.2 ** user_streak, 2)
     
-    # Calculate user's ranks in different categories
-    points_ranks = []
-    streak_ranks = []
-    shame_ranks = []
-    
-    for uid, data in user_info.items():
-        if 'github_username' in data:
-            points_ranks.append((uid, data.get('points', 0)))
-            streak_ranks.append((uid, data.get('streak_weeks', 0)))
-            shame_ranks.append((uid, data.get('shame_count', 0)))
-    
-    points_ranks.sort(key=lambda x: x[1], reverse=True)
-    streak_ranks.sort(key=lambda x: x[1], reverse=True)
-    shame_ranks.sort(key=lambda x: x[1], reverse=True)
-    
-    points_rank = next((i+1 for i, (uid, _) in enumerate(points_ranks) if uid == user_id), "N/A")
-    streak_rank = next((i+1 for i, (uid, _) in enumerate(streak_ranks) if uid == user_id), "N/A")
-    shame_rank = next((i+1 for i, (uid, _) in enumerate(shame_ranks) if uid == user_id), "N/A")
+    # Calculate user's ranks in different categories (tied users share a rank)
+    points_rank, total_users = rankings.rank_of(member.id, 'points')
+    streak_rank, _ = rankings.rank_of(member.id, 'streak_weeks')
+    shame_rank, _ = rankings.rank_of(member.id, 'shame_count')
     
     # Calculate how many points to next rank
-    points_to_next = "Already #1! 👑" if points_rank == 1 else "N/A"
-    if points_rank != 1 and points_rank != "N/A":
-        next_user_points = points_ranks[points_rank-2][1]  # -2 because zero-indexed and we want the user above
-        points_to_next = next_user_points - user_points
+    points_to_next = "Already #1! 👑"
+    if points_rank != 1:
+        points_to_next = rankings.to_next_rank(member.id, 'points')
     
     # Create embed
     embed = discord.Embed(
@@ -256,9 +245,9 @@ async def rank(ctx, member: discord.Member = None):
     
     embed.add_field(
         name="Rank Status",
-        value=f"🏆 Points Rank: **#{points_rank}** of {len(points_ranks)}\n"
-              f"🔥 Streak Rank: **#{streak_rank}** of {len(streak_ranks)}\n"
-              f"😱 Shame Rank: **#{shame_rank}** of {len(shame_ranks)}",
+        value=f"🏆 Points Rank: **#{points_rank}** of {total_users}\n"
+              f"🔥 Streak Rank: **#{streak_rank}** of {total_users}\n"
+              f"😱 Shame Rank: **#{shame_rank}** of {total_users}",
         inline=True
     )
     
@@ -285,4 +274,6 @@ async def rank(ctx, member: discord.Member = None):
 
 def setup(bot):
     bot.add_command(leaderboard)
-    bot.add_command(rank)
\ No newline at end of file
+    bot.add_command(rank)
+    # Any points change can reorder the leaderboard
+    bot.user_store.add_listener(lambda user_ids: bot.chart_cache.invalidate('leaderboard'))
\ No newline at end of file
@@ -1,54 +1,254 @@
+import asyncio
+import hashlib
 import os
+from collections import OrderedDict
 import aiohttp
 import discord
 from discord.ext import commands
 from datetime import datetime
+from fanout import describe_failure
+from media_store import link_or_copy, media_key
 
-async def get_media_links(channel):
-    media = []
-    async for message in channel.history(limit=None):
-        for attachment in message.attachments:
-            if not attachment.url.endswith('.gif') and 'cdn' in attachment.url:
-                media.append((attachment.url, message.created_at))
-        for embed in message.embeds:
-            if hasattr(embed, 'url') and embed.url and not embed.url.endswith('.gif') and 'cdn' in embed.url:
-                media.append((embed.url, message.created_at))
-    return media
-
-async def download_media(media, folder_path):
-    async with aiohttp.ClientSession() as session:
-        i = 0
-        for url, timestamp in media:
-            i += 1
-            # Extract the file extension
-            file_extension = url.split('?')[0].split('.')[-1]
-            # Format the filename using the message's timestamp
-            filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}.{file_extension}"
-            print(f"Dumping {filename}... ({i}/{len(media)})")
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    file_path = os.path.join(folder_path, filename)
-                    with open(file_path, 'wb') as f:
-                        while True:
-                            chunk = await resp.content.read(1024)
-                            if not chunk:
-                                break
-                            f.write(chunk)
+DOWNLOAD_WORKERS = 4
+QUEUE_SIZE = 32  # Media links found but not yet picked up by a worker
+CHUNK_SIZE = 256 * 1024  # Bytes buffered before each write to disk
+CURSOR_BATCH = 500  # Messages read between saved cursors
+
+def get_media_links(message):
+    """
+    Returns (url, media key) for the media in a message worth dumping.
+    """
+    links = [(attachment.url, media_key(attachment.url, attachment.id)) for attachment in message.attachments]
+    links += [(embed.url, media_key(embed.url)) for embed in message.embeds if getattr(embed, 'url', None)]
+    return [(url, key) for url, key in links if not url.split('?')[0].endswith('.gif') and 'cdn' in url]
+
+def media_filename(message, url, key):
+    # Format the filename using the message's timestamp, plus the attachment
+    # ID so files from the same second don't collide
+    suffix = key if key.isdigit() else f"{message.id}_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]}"
+    # Extract the file extension
+    file_extension = url.split('?')[0].split('.')[-1]
+    return f"{message.created_at.strftime('%Y%m%d_%H%M%S')}_{suffix}.{file_extension}"
+
+class DumpCursor:
+    """
+    Moves a channel's dump cursor forward while downloads finish out of
+    order. It only passes a message once all of that message's media is
+    either stored or recorded as failed, so an interrupted dump reads it
+    again, while a failed download is retried by key and never holds the
+    cursor back.
+    """
+    def __init__(self, store, channel_id):
+        self.store = store
+        self.channel_id = channel_id
+        self._pending = OrderedDict()  # message_id -> downloads left, oldest first
+        self._read_to = None
+        self._read = 0
+        self._saved = store.cursor(channel_id)
+
+    def read(self, message_id, downloads):
+        if downloads:
+            self._pending[message_id] = downloads
+        self._read_to = message_id
+        self._read += 1
+        if self._read % CURSOR_BATCH == 0:
+            self.save()
+
+    def done(self, message_id):
+        # Retries are for messages the cursor has already passed
+        if message_id in self._pending:
+            self._pending[message_id] -= 1
+            self.save()
+
+    def save(self):
+        while self._pending and next(iter(self._pending.values())) == 0:
+            self._pending.popitem(last=False)
+        # History is read after the cursor, so stopping just before the first unfinished message re-reads it
+        position = next(iter(self._pending)) - 1 if self._pending else self._read_to
+        if position is not None and position != self._saved:
+            self.store.set_cursor(self.channel_id, position)
+            self._saved = position
+
+async def queue_retries(channel, store, queue):
+    """
+    Puts the media that failed in earlier dumps back on the queue. The
+    messages are fetched again since Discord's CDN links expire. Returns
+    how many were queued.
+    """
+    last_message_id = store.cursor(channel.id)
+    by_message = {}
+    for key, message_id in store.retries(channel.id):
+        # Anything after the cursor is read again with the history anyway
+        if last_message_id is not None and message_id <= last_message_id:
+            by_message.setdefault(message_id, []).append(key)
+
+    queued = 0
+    for message_id, keys in by_message.items():
+        try:
+            message = await channel.fetch_message(message_id)
+        except discord.HTTPException as e:
+            for key in keys:
+                store.record_failure(channel.id, key, message_id, permanent=isinstance(e, discord.NotFound))
+            continue
+        links = {key: url for url, key in get_media_links(message)}
+        for key in keys:
+            if key not in links:
+                # The attachment was removed from the message
+                store.record_failure(channel.id, key, message_id, permanent=True)
+                continue
+            await queue.put((links[key], key, message_id, media_filename(message, links[key], key)))
+            queued += 1
+    return queued
+
+async def queue_media(channel, store, cursor, queue, workers):
+    """
+    Queues earlier failures for another try, then walks the channel's
+    history after its cursor, oldest first, and puts (url, key,
+    message_id, filename) on the queue for every piece of media that isn't
+    stored yet and hasn't failed for good, waiting whenever the queue is
+    full. Once it has read everything, puts one None per worker to stop
+    them. Returns how many were queued.
+    """
+    queued = 0
+    try:
+        queued += await queue_retries(channel, store, queue)
+        last_message_id = store.cursor(channel.id)
+        after = discord.Object(id=last_message_id) if last_message_id is not None else None
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            links = [
+                (url, key) for url, key in get_media_links(message)
+                if not store.has(channel.id, key) and not store.gave_up(channel.id, key)
+            ]
+            cursor.read(message.id, len(links))
+            for url, key in links:
+                await queue.put((url, key, message.id, media_filename(message, url, key)))
+                queued += 1
+    finally:
+        cursor.save()
+    for _ in range(workers):
+        await queue.put(None)
+    return queued
+
+def _write(file, digest, data):
+    file.write(data)
+    digest.update(data)
+
+async def download_file(http_client, url, file_path):
+    """
+    Streams a URL to a file, doing every disk write in a thread so a slow
+    disk never holds up the event loop. Returns (status, SHA-256 of the
+    content), with no hash if the server didn't send the file.
+    """
+    async with http_client.get(url) as resp:
+        if resp.status != 200:
+            return resp.status, None
+        digest = hashlib.sha256()
+        file = await asyncio.to_thread(open, file_path, 'wb')
+        try:
+            buffer = bytearray()
+            async for data in resp.content.iter_chunked(CHUNK_SIZE):
+                buffer += data
+                if len(buffer) >= CHUNK_SIZE:
+                    await asyncio.to_thread(_write, file, digest, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(_write, file, digest, bytes(buffer))
+        finally:
+            await asyncio.to_thread(file.close)
+    return resp.status, digest.hexdigest()
+
+async def download_worker(http_client, store, cursor, queue, channel_id):
+    """
+    Downloads media off the queue into the store until it gets None,
+    recording every download that fails. Returns how many files were
+    saved.
+    """
+    saved = 0
+    while True:
+        item = await queue.get()
+        if item is None:
+            return saved
+        url, key, message_id, filename = item
+        print(f"Dumping {filename}...")
+        temp_path = store.temp_path()
+        try:
+            status, sha256 = await download_file(http_client, url, temp_path)
+            if sha256 is None:
+                print(f"Could not dump {filename}: the CDN answered {status}")
+                os.remove(temp_path)
+                # A client error other than a timeout or rate limit means the file is gone
+                store.record_failure(channel_id, key, message_id, permanent=400 <= status < 500 and status not in (408, 429))
+                cursor.done(message_id)
+                continue
+            await asyncio.to_thread(store.store, temp_path, sha256)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            print(f"Could not dump {filename}: {describe_failure(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            store.record_failure(channel_id, key, message_id)
+            cursor.done(message_id)
+            continue
+        store.record(key, channel_id, message_id, filename, sha256)
+        cursor.done(message_id)
+        saved += 1
+
+async def download_media(http_client, store, channel, workers=DOWNLOAD_WORKERS):
+    """
+    Downloads every piece of a channel's media the store doesn't have yet,
+    while the history is still being read. Returns (queued, saved).
+    """
+    # Media whose stored file was deleted is downloaded again like a failure
+    media = store.channel_media(channel.id)
+    missing = await asyncio.to_thread(lambda: [key for key, _, path in media if not os.path.exists(path)])
+    store.forget(channel.id, missing)
+
+    cursor = DumpCursor(store, channel.id)
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    tasks = [asyncio.create_task(queue_media(channel, store, cursor, queue, workers))]
+    tasks += [asyncio.create_task(download_worker(http_client, store, cursor, queue, channel.id)) for _ in range(workers)]
+    try:
+        # If the workers die the producer would wait on a full queue forever,
+        # so whichever side fails first takes the other down with it
+        queued, *saved = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return queued, sum(saved)
+
+def link_media(media, folder_path):
+    for _, filename, object_path in media:
+        link_or_copy(object_path, os.path.join(folder_path, filename))
 
 @commands.command()
 async def photodump(ctx):
     channel = ctx.channel
-    media = await get_media_links(channel)
+    store = ctx.bot.media_store
+    try:
+        queued, saved = await download_media(ctx.bot.http_client, store, channel)
+    except discord.HTTPException as e:
+        await ctx.send(f"Couldn't read this channel's history. ({e})")
+        return
+
+    media = store.channel_media(channel.id)
     if not media:
         await ctx.send("No available media found.")
         return
 
     datetime_str = datetime.now().strftime("%Y%m%d_%H%M%S")
     folder_name = f"dump_{channel.name}_{datetime_str}"
-    os.makedirs(folder_name, exist_ok=True)
+    try:
+        os.makedirs(folder_name, exist_ok=True)
+        # The files are already in the store, so the dump folder is just links
+        await asyncio.to_thread(link_media, media, folder_name)
+    except OSError as e:
+        await ctx.send(f"Couldn't write the dump to {folder_name}. ({e})")
+        return
 
-    await download_media(media, folder_name)
-    await ctx.send(f"Media has been saved to {folder_name}.")
+    reply = f"Media has been saved to {folder_name}. ({len(media)} files, {saved} newly downloaded)"
+    if saved < queued:
+        reply += f"\n{queued - saved} files couldn't be downloaded. The next dump will retry the ones that might still be there."
+    await ctx.send(reply)
 
 def setup(bot):
     bot.add_command(photodump)
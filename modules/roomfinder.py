@@ -1,15 +1,41 @@
 import time
-import aiohttp
-from bs4 import BeautifulSoup
-import re
-import json
-import os
+from collections import OrderedDict
 from datetime import datetime
+import discord
 from discord.ext import commands
-
-# URL to scrape for course information
-course_schedule_url = "https://web.csulb.edu/depts/enrollment/registration/class_schedule/Fall_2024/By_Subject/"
-room_bookings = []
+from scheduler import schedule
+from room_dataset import current_term, parse_term
+from room_scraper import RoomScrapeError, time_to_24h
+
+REPLY_CACHE_SIZE = 256  # Rendered findroom replies kept
+CACHE_SLOT_MINUTES = 5  # Queries about "now" within the same 5 minutes share a reply
+
+class ReplyCache:
+    """
+    LRU of rendered findroom replies, keyed by everything that goes into
+    one. Entries for a term are dropped whenever its room data changes.
+    """
+    def __init__(self, max_size=REPLY_CACHE_SIZE):
+        self.max_size = max_size
+        self._replies = OrderedDict()
+
+    def get(self, key):
+        reply = self._replies.get(key)
+        if reply is not None:
+            self._replies.move_to_end(key)
+        return reply
+
+    def put(self, key, reply):
+        self._replies[key] = reply
+        self._replies.move_to_end(key)
+        while len(self._replies) > self.max_size:
+            self._replies.popitem(last=False)
+
+    def invalidate(self, term):
+        for key in [key for key in self._replies if key[0] == term]:
+            del self._replies[key]
+
+reply_cache = ReplyCache()
 
 WEEKDAY_ABBR = {
     0: "M",
@@ -21,141 +47,54 @@ WEEKDAY_ABBR = {
     6: "Su"
 }
 
-class Room:
-    def __init__(self, location, booked_times=None):
-        self.location = location
-        self.booked_times = booked_times if booked_times is not None else []
+def parse_clock(text):
+    """
+    Parses a time given as 24-hour HHMM (1630) or as 4:30pm/16:30 into HHMM.
+    """
+    if text.isdigit():
+        hours, minutes = divmod(int(text), 100)
+    else:
+        hours, minutes = divmod(time_to_24h(text), 100)
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"{text} isn't a time of day")
+    return hours * 100 + minutes
 
-    def add_booked_time(self, day, time_tuple):
-        self.booked_times.append((day, time_tuple))
+def add_minutes(hhmm, minutes):
+    total = hhmm // 100 * 60 + hhmm % 100 + minutes
+    return min(total // 60 * 100 + total % 60, 2400)
 
-    def is_open(self, day, current_time):
-        for booked_day, (start, end) in self.booked_times:
-            if day == booked_day:
-                if start <= current_time <= end:
-                    return False
-        return True
-    
-    def __str__(self):
-        return self.location
-
-def parse_sections_table(table):
-    sections = []
-    headers = [th.text.strip() for th in table.find_all('th', scope='col')]
-    
-    for row in table.find_all('tr')[1:]:  # Skipping the header row
-        cells = row.find_all(['th', 'td'])
-        section_info = {headers[i]: cells[i].get_text(strip=True) for i in range(len(cells))}
-        sections.append(section_info)
-
-    formatted = []
-    for section in sections:
-        start_time, end_time = parse_times(section['TIME'])
-        if section['DAYS'] == 'TBA' or section['DAYS'] == 'NA':
-            continue
-        for day in parse_days(section['DAYS']):
-            formatted_section = {
-                "Location": section['LOCATION'],
-                "Day": day,
-                "Start": start_time,
-                "End": end_time
-            }
-        formatted.append(formatted_section)
-
-    return formatted
-
-def parse_times(time_str):
-    if time_str == 'TBA' or time_str == 'NA':
-        return (0, 0)
-
-    start_time_str, end_time_str = time_str.split('-')
-
-    if 'am' in end_time_str.lower() and 'am' not in start_time_str.lower() and 'pm' not in start_time_str.lower():
-        start_time_str += 'am'
-    elif 'pm' in end_time_str.lower() and 'pm' not in start_time_str.lower() and 'am' not in start_time_str.lower():
-        start_time_str += 'pm'
-
-    start_time = time_to_24h(start_time_str)
-    end_time = time_to_24h(end_time_str)
-
-    if start_time > end_time:
-        start_time -= 1200
-
-    return (start_time, end_time)
-
-def time_to_24h(t_str):
-    t_str = t_str.lower()
-    is_pm = 'pm' in t_str
-    t_str = t_str.replace('am', '').replace('pm', '')
-
-    if ':' in t_str:
-        hours, minutes = t_str.split(':')
-    else:
-        hours, minutes = t_str, '00'
-
-    hours, minutes = int(hours), int(minutes)
-
-    if is_pm and hours < 12:
-        hours += 12
-    elif not is_pm and hours == 12:
-        hours = 0
-
-    return (hours * 100) + minutes
-
-def parse_days(days_str):
-    return [day for day in re.findall('[A-Z][^A-Z]*', days_str)]
-
-async def get_page_html(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                print("Failed to retrieve the web page.")
-                return []
-
-            soup = BeautifulSoup(await response.text(), 'html.parser')
-    return soup
-
-def get_subjects(html):
-    toplink_divs = html.find_all('div', class_='indexList')
-    hrefs = []
-    for div in toplink_divs:
-        links = div.find_all('a')
-        for link in links:
-            if link.get('href') != None and link.get('href') != "#":
-                hrefs.append(link.get('href'))
-    return hrefs
-
-def get_rooms(html):
-    courses = html.find_all(lambda tag: tag.name == "div" and tag.get("class", []) == ["courseHeader"])
-    for course_header in courses:
-        if course_header:
-            sections_table = course_header.find_next_sibling('table')
-            if sections_table:
-                sections = parse_sections_table(sections_table)
-                for section in sections:
-                    for room in room_bookings:
-                        if room.location == section['Location']:
-                            room.add_booked_time(section['Day'], (section['Start'], section['End']))
-                            break
-                    else:
-                        room = Room(section['Location'], [(section['Day'], (section['Start'], section['End']))])
-                        room_bookings.append(room)
+def format_clock(hhmm):
+    return datetime.strptime(f"{hhmm:04d}", '%H%M').strftime('%-I:%M%p').lower() if hhmm != 2400 else 'the end of the day'
 
 @commands.command()
 async def findroom(ctx, arg1 = None, *args):
+    """
+    Finds open rooms on campus.
+    Usage: !findroom [location filter] [--t HHMM] [--d day] [--for minutes] [--until HHMM] [--term Fall_2024] [--v] [--buildings]
+    Example: !findroom ECS --for 90 - ECS rooms free for the next hour and a half
+    Example: !findroom --buildings - How many rooms are free in each building
+    """
     full = False
+    buildings = False
+    if arg1 is not None and arg1.startswith("--"):
+        # No filter given, just flags
+        args = (arg1,) + args
+        arg1 = None
     if args != None:
         filter = arg1
 
         if "--v" in args or "verbose" in args or "all" in args: 
             full = True
 
+        if "--buildings" in args:
+            buildings = True
+
         custom_time = None
         if "--t" in args:
             try:
-                custom_time = int(time_to_24h(args[args.index("--t") + 1]))
+                custom_time = parse_clock(args[args.index("--t") + 1])
             except:
-                await ctx.reply(f'Invalid time format. Please use 24-hour time format (e.g. 1200 for 12:00 PM).\nParsed to: {time_to_24h(args[args.index("--t") + 1])}')
+                await ctx.reply('Invalid time format. Please use 24-hour time format (e.g. 1200 for 12:00 PM).')
                 return
         
         custom_day = None
@@ -164,7 +103,7 @@ async def findroom(ctx, arg1 = None, *args):
                 custom_day = args[args.index("--d") + 1].strip()
                 print(f"-{custom_day}-")
                 if custom_day.upper() in map(lambda x: x.upper(), WEEKDAY_ABBR.values()):
-                    custom_day = custom_day.upper()
+                    custom_day = next(day for day in WEEKDAY_ABBR.values() if day.upper() == custom_day.upper())
                 else:
                     await ctx.reply(f"Invalid day format. Please use a valid day abbreviation: {WEEKDAY_ABBR.values()}.")
                     return
@@ -172,60 +111,108 @@ async def findroom(ctx, arg1 = None, *args):
                 await ctx.reply(f"Error: {e}")
                 return
 
-    rooms_data_file = "rooms_data.json"
-    
-    if not os.path.exists(rooms_data_file):
-        print("Scraping rooms because no saved data file found...")
-        ctx.reply("Scraping rooms because no saved data file found... Please wait.")
-        subjects_page = await get_page_html(course_schedule_url)
-        subjects = get_subjects(subjects_page)
-        for subject in subjects:
-            course_list = await get_page_html(course_schedule_url + subject)
-            get_rooms(course_list)
-        
-        with open(rooms_data_file, 'w') as file:
-            rooms_dicts = [{'location': room.location, 'booked_times': room.booked_times} for room in room_bookings]
-            json.dump(rooms_dicts, file)
-    else:
-        print("Loading rooms from saved data file...")
-        with open(rooms_data_file, 'r') as file:
-            rooms_dicts = json.load(file)
-            room_bookings.clear()
-            for room_dict in rooms_dicts:
-                room = Room(room_dict['location'], room_dict['booked_times'])
-                room_bookings.append(room)
+        free_for = None
+        if "--for" in args:
+            try:
+                free_for = int(args[args.index("--for") + 1])
+                if free_for <= 0:
+                    raise ValueError
+            except:
+                await ctx.reply("Invalid duration. Please give a number of minutes (e.g. `--for 90`).")
+                return
+
+        term = current_term()
+        if "--term" in args:
+            try:
+                term = parse_term(args[args.index("--term") + 1])
+            except (ValueError, IndexError):
+                await ctx.reply("Invalid term. Please give a season and year (e.g. `--term Spring_2025`).")
+                return
+
+        free_until = None
+        if "--until" in args:
+            try:
+                free_until = parse_clock(args[args.index("--until") + 1])
+            except:
+                await ctx.reply("Invalid time format. Please use 24-hour time format (e.g. `--until 1630`).")
+                return
+
+    rooms = ctx.bot.rooms.get(term)
+    if rooms is None:
+        print(f"Scraping rooms for {term} because no saved data was found...")
+        status = await ctx.reply(f"Scraping the {term.replace('_', ' ')} class schedule for the first time... Please wait.")
+
+        async def report_progress(done, total):
+            try:
+                await status.edit(content=f"Scraping the {term.replace('_', ' ')} class schedule for the first time... {done}/{total} subjects done.")
+            except discord.HTTPException:
+                pass
+
+        try:
+            rooms = await ctx.bot.rooms.load(term, ctx.bot.http_client, progress=report_progress)
+        except RoomScrapeError as e:
+            await status.edit(content=f"Couldn't scrape the {term.replace('_', ' ')} class schedule, try again later. ({e})")
+            return
 
     current_time = custom_time or int(time.strftime("%H%M"))
     current_day = custom_day or WEEKDAY_ABBR[datetime.now().weekday()]
 
+    window_end = None
+    if free_for or free_until:
+        window_end = max(add_minutes(current_time, free_for or 0), free_until or 0)
+        if window_end <= current_time:
+            await ctx.reply("`--until` has to be later than the time you're searching from.")
+            return
+
+    # Everyone asking the same thing in the same 5 minutes gets the same answer
+    custom = bool(custom_day or custom_time)
+    cache_key = (
+        term, current_day, current_time if custom else current_time - current_time % CACHE_SLOT_MINUTES,
+        (filter or '').strip().lower(), full, free_for, free_until, custom, buildings
+    )
+    reply = reply_cache.get(cache_key)
+    if reply is None:
+        if buildings:
+            reply = build_buildings_reply(rooms, term, current_day, current_time, window_end, filter)
+        else:
+            reply = build_reply(rooms, term, current_day, current_time, window_end, filter, full, custom)
+        reply_cache.put(cache_key, reply)
+
+    await ctx.reply(reply)
+
+def find_open_rooms(rooms, current_day, current_time, window_end, candidates=None):
+    """
+    Returns the open rooms, only looking at rooms at the `candidates`
+    positions if given.
+    """
+    if window_end:
+        # Every candidate is checked against the whole window at once
+        return rooms.availability().free_between(current_day, current_time, window_end, candidates)
+    if candidates is not None:
+        rooms = map(rooms.locations().rooms.__getitem__, candidates)
+    return [room for room in rooms if room.is_open(current_day, current_time)]
+
+def build_reply(rooms, term, current_day, current_time, window_end, filter, full, custom):
     print(f"Finding open rooms for {current_day} at {current_time}...")
+    candidates = None
     if filter:
         print(f"Filtering for locations containing '{filter.upper()}'...")
-    open_rooms = []
-    for room in room_bookings:
-        if room.is_open(current_day, current_time):
-            if filter:
-                if filter.lower() in room.location.lower():
-                    open_rooms.append(room)
-            else:
-                open_rooms.append(room)
+        candidates = rooms.locations().matching(filter)
+    if window_end:
+        print(f"Requiring rooms to stay free until {window_end}...")
+    open_rooms = find_open_rooms(rooms, current_day, current_time, window_end, candidates)
 
     formatted_open_rooms = {}
     full_string = "All currently open rooms:\n\n"
     
     for room in open_rooms:
-        last_start = 2400
-        for day, (start, end) in room.booked_times:
-            if start > current_time:
-                if start < last_start:
-                    last_start = start
+        last_start = room.next_busy(current_day, current_time) or 2400
         
         formatted_open_rooms[room.location] = last_start
         full_string += f"{room} until __{datetime.strptime(str(last_start), '%H%M').strftime('%-I:%M%p').lower() if last_start != 2400 else 'end of the day'}__\n"
 
     if formatted_open_rooms == {}:
-        await ctx.reply("__**No open rooms found that meet your filters.**__")
-        return
+        return "__**No open rooms found that meet your filters.**__"
     
     max_value = max(formatted_open_rooms.values())
 
@@ -235,10 +222,58 @@ async def findroom(ctx, arg1 = None, *args):
     if full:
         reply += full_string
 
-    if custom_day or custom_time:
+    if custom:
         reply += f"\n\n(Filtered by `--d {current_day} --t {current_time}`)"
 
-    await ctx.reply(reply)
+    if window_end:
+        reply += f"\n\n(Only rooms free until {format_clock(window_end)})"
+
+    if term != current_term():
+        reply += f"\n\n(Using the {term.replace('_', ' ')} schedule)"
+
+    return reply
+
+def build_buildings_reply(rooms, term, current_day, current_time, window_end, filter):
+    locations = rooms.locations()
+    buildings = locations.buildings(filter.strip() if filter else '')
+    if not buildings:
+        return "__**No buildings found that meet your filters.**__"
+
+    candidates = sorted(index for positions in buildings.values() for index in positions)
+    open_rooms = set(find_open_rooms(rooms, current_day, current_time, window_end, candidates))
+
+    cells = []
+    for code, positions in buildings.items():
+        free = sum(1 for index in positions if locations.rooms[index] in open_rooms)
+        cells.append(f"{code:<8}{free:>3}/{len(positions):<4}")
+    lines = ["".join(cells[i:i + 4]).rstrip() for i in range(0, len(cells), 4)]
+
+    reply = f"**Free rooms per building ({current_day} at {format_clock(current_time)}):**\n```\n" + "\n".join(lines) + "\n```"
+
+    if window_end:
+        reply += f"\n(Only rooms free until {format_clock(window_end)})"
+
+    if term != current_term():
+        reply += f"\n(Using the {term.replace('_', ' ')} schedule)"
+
+    return reply
+
+@schedule("0 4 * * *")  # Every day at 4:00
+async def scheduled_room_refresh(bot):
+    """
+    Re-checks the current term and every term in memory for schedule
+    changes, then drops data for terms that are long over.
+    """
+    for term in dict.fromkeys([current_term()] + bot.rooms.loaded_terms()):
+        try:
+            rooms, changed = await bot.rooms.refresh(term, bot.http_client)
+            print(f"Refreshed {term} room data: {changed} pages changed, {len(rooms)} rooms")
+        except RoomScrapeError as e:
+            print(f"Could not refresh {term} room data: {e}")
+    bot.rooms.evict()
 
 def setup(bot):
     bot.add_command(findroom)
+    scheduled_room_refresh.start_task(bot)
+    # Replies rendered from old room data would be wrong
+    bot.rooms.add_listener(reply_cache.invalidate)
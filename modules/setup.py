@@ -1,27 +1,11 @@
-import json
 import discord
 from discord.ext import commands
-import aiohttp
 import re
+from github_client import GitHubError
 
-# Load and save user info
-def load_user_info():
-    try:
-        with open('../user_info.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_user_info(data):
-    with open('../user_info.json', 'w') as file:
-        json.dump(data, file, indent=4)
-
-async def validate_github_username(username):
+async def validate_github_username(github, username):
     """Verify that a GitHub username exists"""
-    url = f'https://api.github.com/users/{username}'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return response.status == 200
+    return await github.user_exists(username)
 
 @commands.command()
 async def setupuser(ctx, github_username=None):
@@ -34,30 +18,25 @@ async def setupuser(ctx, github_username=None):
         return
     
     # Validate GitHub username
-    if not await validate_github_username(github_username):
+    try:
+        username_exists = await validate_github_username(ctx.bot.github, github_username)
+    except GitHubError:
+        await ctx.send("❌ Couldn't reach GitHub to check that username right now. Please try again later.")
+        return
+    if not username_exists:
         await ctx.send(f"❌ GitHub username `{github_username}` doesn't seem to exist. Please check the spelling and try again.")
         return
     
-    user_info = load_user_info()
-    user_id = str(ctx.author.id)
+    user_store = ctx.bot.user_store
+    user_data = user_store.get(ctx.author.id, {})
     
-    # Initialize user if not exists
-    if user_id not in user_info:
-        user_info[user_id] = {}
-    
-    # Update GitHub username
-    user_info[user_id]['github_username'] = github_username
-    
-    # Initialize other fields if they don't exist
-    if 'points' not in user_info[user_id]:
-        user_info[user_id]['points'] = 0
-    if 'streak_weeks' not in user_info[user_id]:
-        user_info[user_id]['streak_weeks'] = 0
-    if 'shame_count' not in user_info[user_id]:
-        user_info[user_id]['shame_count'] = 0
-    
-    # Save updated user info
-    save_user_info(user_info)
+    # Update GitHub username and initialize other fields if they don't exist
+    user_store.update(ctx.author.id, {
+        'github_username': github_username,
+        'points': user_data.get('points', 0),
+        'streak_weeks': user_data.get('streak_weeks', 0),
+        'shame_count': user_data.get('shame_count', 0),
+    })
     
     # Create confirmation embed
     embed = discord.Embed(
@@ -108,19 +87,15 @@ async def addinfo(ctx, key=None, *, value=None):
         await ctx.send(f"❌ The key `{key}` is protected and cannot be modified directly.")
         return
     
-    user_info = load_user_info()
-    user_id = str(ctx.author.id)
+    user_store = ctx.bot.user_store
     
     # Initialize user if not exists
-    if user_id not in user_info:
+    if ctx.author.id not in user_store:
         await ctx.send("❌ You need to set up your profile first. Use `!setup <github_username>`")
         return
     
     # Update the custom information
-    user_info[user_id][key] = value
-    
-    # Save updated user info
-    save_user_info(user_info)
+    user_store.update(ctx.author.id, {key: value})
     
     await ctx.send(f"✅ Added `{key}: {value}` to your profile. View your profile with `!stats`")
 
@@ -143,24 +118,20 @@ async def removeinfo(ctx, key=None):
         await ctx.send(f"❌ The key `{key}` is protected and cannot be removed.")
         return
     
-    user_info = load_user_info()
-    user_id = str(ctx.author.id)
+    user_store = ctx.bot.user_store
     
     # Check if user exists
-    if user_id not in user_info:
+    if ctx.author.id not in user_store:
         await ctx.send("❌ You need to set up your profile first. Use `!setupuser <github_username>`")
         return
     
     # Check if key exists
-    if key not in user_info[user_id]:
+    if key not in user_store.get(ctx.author.id):
         await ctx.send(f"❌ The key `{key}` doesn't exist in your profile.")
         return
     
     # Remove the key
-    del user_info[user_id][key]
-    
-    # Save updated user info
-    save_user_info(user_info)
+    user_store.remove_keys(ctx.author.id, [key])
     
     await ctx.send(f"✅ Removed `{key}` from your profile.")
 
@@ -1,115 +1,104 @@
-import json
 import discord
 from discord.ext import commands
-import matplotlib.pyplot as plt
 import io
-from datetime import datetime, timedelta
+import asyncio
+import typing
+from datetime import datetime
 import os
-import aiohttp
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+from github_client import GitHubError
+from chart_cache import chart_key
+from chart_renderer import THEME
+from message_index import BACKFILL_DAYS
 
-# Load user information from JSON file
-def load_user_info():
-    try:
-        with open('../user_info.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
+# Flag -> (rollup unit, longest range allowed). Nothing older than the
+# backfill horizon is indexed, so no range reaches past it.
+ACTIVITY_RANGES = {
+    '--days': ('day', BACKFILL_DAYS),
+    '--weeks': ('week', BACKFILL_DAYS // 7),
+    '--months': ('month', BACKFILL_DAYS * 12 // 365),
+}
+UNIT_NAMES = {'day': 'Days', 'week': 'Weeks', 'month': 'Months'}
 
-async def get_user_message_counts(guild, user_id, days=30):
-    """Get message counts for the last specified days"""
-    today = datetime.now()
-    counts = {}
-    
-    # Initialize all days with zero
-    for i in range(days):
-        date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        counts[date] = 0
-    
-    # Count messages in all channels
-    for channel in guild.text_channels:
-        try:
-            async for message in channel.history(limit=None, after=today - timedelta(days=days)):
-                if message.author.id == user_id:
-                    date = message.created_at.strftime('%Y-%m-%d')
-                    if date in counts:
-                        counts[date] += 1
-        except (discord.Forbidden, discord.HTTPException):
-            continue
-    
-    # Convert to ordered list for plotting
-    dates = sorted(counts.keys())
-    message_counts = [counts[date] for date in dates]
-    
-    return dates, message_counts
+def parse_activity_range(args):
+    """
+    Parses an optional `--days N`, `--weeks N` or `--months N`.
+    Returns (unit, periods), defaulting to the last 30 days.
+    """
+    if not args:
+        return 'day', 30
+    if len(args) != 2 or args[0] not in ACTIVITY_RANGES or not args[1].isdigit():
+        raise ValueError("Usage: `!stats [@user] [--days N | --weeks N | --months N]`")
+    unit, max_periods = ACTIVITY_RANGES[args[0]]
+    periods = int(args[1])
+    if not 1 <= periods <= max_periods:
+        raise ValueError(f"Please pick between 1 and {max_periods} {UNIT_NAMES[unit].lower()}.")
+    return unit, periods
 
-async def generate_activity_graph(guild, user_id):
-    """Generate an activity graph for the user"""
-    dates, message_counts = await get_user_message_counts(guild, user_id)
-    
-    plt.figure(figsize=(10, 5))
-    plt.plot(range(len(dates)), message_counts, marker='o', linestyle='-', color='#5865F2')
-    plt.title(f'Discord Activity (Last 30 Days)')
-    plt.xlabel('Days Ago')
-    plt.ylabel('Messages')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    
-    # Add the dates as x-axis labels but only show every few days
-    tick_indices = range(0, len(dates), 5)
-    plt.xticks(tick_indices, [dates[i].split('-')[2] + '/' + dates[i].split('-')[1] for i in tick_indices])
-    
-    # Set background color
-    plt.gca().set_facecolor('#36393F')
-    plt.gcf().set_facecolor('#36393F')
-    
-    # Set text color to white
-    plt.gca().xaxis.label.set_color('white')
-    plt.gca().yaxis.label.set_color('white')
-    plt.gca().title.set_color('white')
-    plt.gca().tick_params(axis='x', colors='white')
-    plt.gca().tick_params(axis='y', colors='white')
+def get_user_message_counts(message_index, guild, user_id, unit='day', periods=30):
+    """Get message counts per day, week or month from the message index"""
+    return message_index.activity(guild.id, user_id, unit, periods)
+
+async def generate_activity_graph(chart_renderer, chart_cache, period_starts, message_counts, unit='day'):
+    """Generate an activity graph from message counts per period"""
+    periods = len(period_starts)
     
-    # Save to bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', facecolor='#36393F')
-    buf.seek(0)
-    plt.close()
+    # Add the dates as x-axis labels but only show a few of them
+    tick_positions = list(range(0, periods, max(1, periods // 6)))
+    tick_format = '%b %Y' if unit == 'month' else '%d/%m'
+    tick_labels = [period_starts[i].strftime(tick_format) for i in tick_positions]
+    chart_args = (
+        message_counts.tolist(),
+        tick_positions,
+        tick_labels,
+        f'Discord Activity (Last {periods} {UNIT_NAMES[unit]})',
+        UNIT_NAMES[unit],
+        'Messages',
+        periods <= 60
+    )
     
-    return buf
+    # Same counts over the same dates always give the same picture
+    cache_key = chart_key('activity', chart_args, THEME)
+    png = chart_cache.get(cache_key)
+    if png is None:
+        png = await chart_renderer.line_chart(*chart_args)
+        chart_cache.put(cache_key, png, tag='activity')
+    return io.BytesIO(png)
 
-async def fetch_github_data(username):
+async def fetch_github_data(github, username):
     """Fetch GitHub data for a user"""
-    url = f'https://api.github.com/users/{username}'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                return None
-            return await response.json()
+    try:
+        return await github.get_user(username)
+    except GitHubError:
+        return None
 
 @commands.command()
-async def stats(ctx, member: discord.Member = None):
+async def stats(ctx, member: typing.Optional[discord.Member] = None, *args):
     """
     Shows a user's profile with stats, points, and activity.
+    Usage: !stats [@user] [--days N | --weeks N | --months N]
+    Example: !stats --weeks 52 - Shows activity over the last year by week
     """
     if member is None:
         member = ctx.author
     
+    try:
+        unit, periods = parse_activity_range(args)
+    except ValueError as e:
+        await ctx.reply(str(e))
+        return
+    
     # Send a loading message first
-    loading_message = await ctx.reply(f"{ctx.author.mention} I'm generating stats for {member.display_name}... This might take a moment due to Discord rate limits.")
+    loading_message = await ctx.reply(f"{ctx.author.mention} I'm generating stats for {member.display_name}...")
     
     try:
-        user_info = load_user_info()
-        user_id = str(member.id)
+        user_data = ctx.bot.user_store.get(member.id)
         
         # If user not in database, initialize them
-        if user_id not in user_info:
+        if user_data is None:
             await loading_message.delete()
             await ctx.send(f"No stats available for {member.display_name}. They need to set their GitHub username first!")
             return
         
-        user_data = user_info[user_id]
-        
         # Create embed
         embed = discord.Embed(
             title=f"📊 {member.display_name}'s Profile",
@@ -119,7 +108,7 @@ async def stats(ctx, member: discord.Member = None):
         
         # Add GitHub info
         if 'github_username' in user_data:
-            github_info = await fetch_github_data(user_data['github_username'])
+            github_info = await fetch_github_data(ctx.bot.github, user_data['github_username'])
             if github_info:
                 embed.add_field(
                     name="GitHub",
@@ -150,14 +139,16 @@ async def stats(ctx, member: discord.Member = None):
         )
         
         # Get message counts
-        dates, message_counts = await get_user_message_counts(ctx.guild, member.id)
-        total_messages = sum(message_counts)
+        period_starts, message_counts = get_user_message_counts(ctx.bot.message_index, ctx.guild, member.id, unit, periods)
+        total_messages = int(message_counts.sum())
+        if not ctx.bot.message_index.is_caught_up(ctx.guild):
+            total_messages = f"{total_messages} (still indexing older messages)"
         
         # Add join date and total messages
         embed.add_field(
             name="Discord Info",
             value=f"📅 Joined: {discord.utils.format_dt(member.joined_at, 'D')}\n" +
-                  f"🔤 Messages (30 days): {total_messages}",
+                  f"🔤 Messages ({periods} {UNIT_NAMES[unit].lower()}): {total_messages}",
             inline=False
         )
         
@@ -180,7 +171,7 @@ async def stats(ctx, member: discord.Member = None):
         embed.set_thumbnail(url=member.display_avatar.url)
         
         # Generate and attach activity graph
-        activity_graph = await generate_activity_graph(ctx.guild, member.id)
+        activity_graph = await generate_activity_graph(ctx.bot.chart_renderer, ctx.bot.chart_cache, period_starts, message_counts, unit)
         file = discord.File(activity_graph, filename="activity.png")
         embed.set_image(url="attachment://activity.png")
         
@@ -195,5 +186,29 @@ async def stats(ctx, member: discord.Member = None):
         # If something goes wrong, edit the loading message to show the error
         await loading_message.edit(content=f"Error generating stats: {str(e)}")
 
+class MessageActivityListener:
+    """
+    Keeps bot.message_index current and starts its backfill once the
+    bot can see its guilds.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.backfill_task = None
+        bot.add_listener(self.on_ready)
+        bot.add_listener(self.on_message)
+        bot.add_listener(self.on_message_delete)
+
+    async def on_ready(self):
+        # on_ready fires again after reconnects; one backfill is enough
+        if self.backfill_task is None or self.backfill_task.done():
+            self.backfill_task = asyncio.create_task(self.bot.message_index.backfill(self.bot.guilds))
+
+    async def on_message(self, message):
+        self.bot.message_index.record_message(message)
+
+    async def on_message_delete(self, message):
+        self.bot.message_index.record_delete(message)
+
 def setup(bot):
-    bot.add_command(stats)
\ No newline at end of file
+    bot.add_command(stats)
+    MessageActivityListener(bot)
\ No newline at end of file
@@ -1,31 +1,15 @@
 import json
-import os
 from discord.ext import commands
 
-USER_INFO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../', 'user_info.json')
-
-# Load user information from JSON file
-def load_user_info():
-    try:
-        with open(USER_INFO_FILE, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-# Save user information to JSON file
-def save_user_info(data):
-    with open(USER_INFO_FILE, 'w') as file:
-        json.dump(data, file, indent=4)
-
 @commands.command()
 async def showuser(ctx, user: str):
     """
     Displays all of the user's full raw JSON.
     """
     user_id = int(user[3:-1])  # Extract user ID from mention format
-    user_info = load_user_info()
-    if str(user_id) in user_info:
-        await ctx.reply(f"User info for {user}: ```json\n{json.dumps(user_info[str(user_id)], indent=4)}\n```")
+    user_store = ctx.bot.user_store
+    if user_id in user_store:
+        await ctx.reply(f"User info for {user}: ```json\n{json.dumps(user_store.get(user_id), indent=4)}\n```")
     else:
         await ctx.reply(f"No info found for user {user}.")
 
@@ -39,26 +23,22 @@ async def usermod(ctx, user: str, operation: str, *, data: str):
     """
 
     user_id = user if user.isnumeric() else int(user[2:-1])  # Extract user ID from mention format
-    user_info = load_user_info()
-    
-    if str(user_id) not in user_info:
-        user_info[str(user_id)] = {}
+    user_store = ctx.bot.user_store
 
     if operation == '+':
         try:
             new_data = json.loads(data)
-            user_info[str(user_id)].update(new_data)
-            save_user_info(user_info)
+            user_store.update(user_id, new_data)
             await ctx.reply(f"Updated info for user {user}.")
         except json.JSONDecodeError:
             await ctx.reply("Invalid JSON object. Usage: !usermod @Mark +{\"key\": \"value\"}")
+        except ValueError as e:
+            await ctx.reply(f"Invalid value. {e}")
     elif operation == '-':
         try:
             keys_to_remove = json.loads(data)
             if isinstance(keys_to_remove, list):
-                for key in keys_to_remove:
-                    user_info[str(user_id)].pop(key, None)
-                save_user_info(user_info)
+                user_store.remove_keys(user_id, keys_to_remove)
                 await ctx.reply(f"Removed specified keys from user {user}.")
             else:
                 await ctx.reply("Invalid key list. Usage: !usermod @Mark -[\"key1\", \"key2\"]")
@@ -72,7 +52,7 @@ async def userdump(ctx):
     """
     Dumps the whole JSON file.
     """
-    user_info = load_user_info()
+    user_info = ctx.bot.user_store.all()
     await ctx.reply(f"Full user info: ```json\n{json.dumps(user_info, indent=4)}\n```")
 
 @commands.command()
@@ -83,10 +63,12 @@ async def setuserinfo(ctx, *, data: str):
     """
     try:
         new_data = json.loads(data)
-        save_user_info(new_data)
+        ctx.bot.user_store.replace_all(new_data)
         await ctx.reply("User info has been updated.")
     except json.JSONDecodeError:
         await ctx.reply("Invalid JSON object. Usage: !setuserinfo {\"key\": \"value\"}")
+    except ValueError as e:
+        await ctx.reply(f"Invalid value. {e}")
 
 def setup(bot):
     bot.add_command(showuser)
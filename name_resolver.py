@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+import discord
+from fanout import gather_bounded
+
+NAME_TTL = 3600  # Seconds a fetched name is trusted
+NAME_CACHE_SIZE = 2048
+FETCH_CONCURRENCY = 8
+FETCH_TIMEOUT = 10  # Seconds
+
+def mention(user_id):
+    """
+    Returns a mention for a user ID. Discord renders it, so no lookup is needed.
+    """
+    return f'<@{user_id}>'
+
+class NameResolver:
+    """
+    Resolves Discord user IDs to display names, available as bot.names.
+
+    Names come from the gateway cache (guild members, then users) when
+    possible, then from a TTL'd LRU of earlier lookups, and only the
+    remaining misses are fetched over REST, concurrently.
+    """
+    def __init__(self, bot, ttl=NAME_TTL, max_size=NAME_CACHE_SIZE):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_size = max_size
+        self._names = OrderedDict()  # user_id -> (display_name, expires_at)
+
+    def _lookup(self, user_id, guild):
+        member = guild.get_member(user_id) if guild is not None else None
+        if member is not None:
+            return member.display_name
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user.display_name
+        cached = self._names.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._names.move_to_end(user_id)
+            return cached[0]
+        return None
+
+    def _remember(self, user_id, name):
+        self._names[user_id] = (name, time.monotonic() + self.ttl)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    async def display_names(self, user_ids, guild=None):
+        """
+        Returns {user_id: display_name} for the given IDs. Users that can't
+        be fetched are left out.
+        """
+        user_ids = [int(user_id) for user_id in user_ids]
+        names = {}
+        misses = []
+        for user_id in user_ids:
+            name = self._lookup(user_id, guild)
+            if name is None:
+                misses.append(user_id)
+            else:
+                names[user_id] = name
+
+        misses = list(dict.fromkeys(misses))
+        users = await gather_bounded(misses, self.bot.fetch_user, concurrency=FETCH_CONCURRENCY, timeout=FETCH_TIMEOUT)
+        for user_id, user in zip(misses, users):
+            if isinstance(user, discord.User):
+                self._remember(user_id, user.display_name)
+                names[user_id] = user.display_name
+            else:
+                print(f"Could not fetch Discord user {user_id}: {user}")
+        return names
+
+    async def display_name(self, user_id, guild=None):
+        return (await self.display_names([user_id], guild)).get(int(user_id))
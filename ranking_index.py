@@ -0,0 +1,143 @@
+from bisect import bisect_left, insort
+from collections import namedtuple
+from user_store import RANKED_FIELDS
+
+# One row of a ranking snapshot
+RankedUser = namedtuple('RankedUser', ('rank', 'user_id') + RANKED_FIELDS)
+
+class RankingIndex:
+    """
+    Sorted rankings of every tracked user, one per ranked field, available
+    as bot.rankings.
+
+    Each ranking is a list of (-value, user_id) kept in order with bisect,
+    so the highest value comes first and tied users fall back to a stable
+    order by ID. A store listener moves only the users that changed, so
+    rank lookups never sort the whole user list. Finding a user is a
+    bisect, but inserting or removing one shifts the list, so a change
+    costs O(n) per field. That's a memmove over a few hundred users here;
+    an order-statistics tree would only pay off with far more. Ranks are
+    competition style: tied users share a rank and the next rank skips
+    past them.
+    """
+    def __init__(self, user_store):
+        self.user_store = user_store
+        self.fields = RANKED_FIELDS
+        self._keys = {field: [] for field in self.fields}
+        self._values = {}  # user_id -> {field: value} for tracked users
+        self._snapshots = {}  # field -> tuple of RankedUser, until the next change
+        self.rebuild()
+        user_store.add_listener(self._on_change)
+
+    def rebuild(self):
+        """
+        Reloads every ranking from the store's ranked() queries, which the
+        SQLite store answers from its column indexes.
+        """
+        self._values = {}
+        for field in self.fields:
+            ranked = self.user_store.ranked(field)
+            for user_id, info in ranked:
+                self._values.setdefault(user_id, {name: info.get(name, 0) for name in self.fields})
+            # Already in order, so this is one linear pass that only fixes
+            # up where the store's order differs (e.g. NULLs counted as 0)
+            self._keys[field] = sorted((-info.get(field, 0), user_id) for user_id, info in ranked)
+        self._snapshots.clear()
+
+    def _on_change(self, user_ids):
+        if user_ids is None:
+            self.rebuild()
+            return
+        self._snapshots.clear()
+        for user_id in user_ids:
+            self._remove(user_id)
+            info = self.user_store.get(user_id)
+            if info is not None and 'github_username' in info:
+                self._add(user_id, info)
+
+    def _add(self, user_id, info):
+        values = {field: info.get(field, 0) for field in self.fields}
+        self._values[user_id] = values
+        for field in self.fields:
+            insort(self._keys[field], (-values[field], user_id))
+
+    def _remove(self, user_id):
+        values = self._values.pop(user_id, None)
+        if values is None:
+            return
+        for field in self.fields:
+            keys = self._keys[field]
+            del keys[bisect_left(keys, (-values[field], user_id))]
+
+    def _check_field(self, field):
+        if field not in self._keys:
+            raise ValueError(f"Can't rank by {field}")
+
+    def __len__(self):
+        return len(self._values)
+
+    def _rank_of_value(self, field, value):
+        # '' sorts before every user ID, so this counts strictly higher values
+        return bisect_left(self._keys[field], (-value, '')) + 1
+
+    def rank_of(self, user_id, field):
+        """
+        Returns (rank, total) for a user. Rank is None if the user isn't
+        tracked.
+        """
+        self._check_field(field)
+        values = self._values.get(str(user_id))
+        if values is None:
+            return None, len(self._values)
+        return self._rank_of_value(field, values[field]), len(self._values)
+
+    def top(self, field, limit=None):
+        """
+        Returns (rank, user_id, value) for the highest `limit` users, or
+        every tracked user if limit is None.
+        """
+        self._check_field(field)
+        keys = self._keys[field] if limit is None else self._keys[field][:limit]
+        entries = []
+        for index, (negated, user_id) in enumerate(keys):
+            if entries and entries[-1][2] == -negated:
+                rank = entries[-1][0]
+            else:
+                rank = index + 1
+            entries.append((rank, user_id, -negated))
+        return entries
+
+    def snapshot(self, field):
+        """
+        Returns every tracked user as a tuple of RankedUser, highest `field`
+        first. The same tuple is handed out until the rankings change, so
+        holding on to it is free and it never shifts underneath a reader.
+        """
+        self._check_field(field)
+        snapshot = self._snapshots.get(field)
+        if snapshot is None:
+            snapshot = tuple(
+                RankedUser(rank, user_id, *(self._values[user_id][name] for name in self.fields))
+                for rank, user_id, _ in self.top(field)
+            )
+            self._snapshots[field] = snapshot
+        return snapshot
+
+    def next_value_above(self, field, value):
+        """
+        Returns the smallest tracked value of `field` above `value`, or None.
+        """
+        self._check_field(field)
+        index = self._rank_of_value(field, value) - 1
+        return -self._keys[field][index - 1][0] if index > 0 else None
+
+    def to_next_rank(self, user_id, field):
+        """
+        Returns how much a user's `field` has to grow to reach the next rank
+        up, or None if they're already first or aren't tracked.
+        """
+        values = self._values.get(str(user_id))
+        if values is None:
+            return None
+        above = self.next_value_above(field, values[field])
+        return None if above is None else above - values[field]
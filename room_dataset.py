@@ -0,0 +1,277 @@
+import asyncio
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from collections import OrderedDict
+from datetime import date
+import numpy as np
+from atomic_file import atomic_write_bytes, atomic_write_json
+from room_registry import BOOKING_DTYPE, RoomRegistry
+from room_scraper import scrape_rooms
+
+ROOMS_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rooms_data')
+SCHEDULE_URL = "https://web.csulb.edu/depts/enrollment/registration/class_schedule/{term}/By_Subject/"
+CHECK_INTERVAL = 10  # Seconds between checks of the data file's mtime
+MAX_LOADED_TERMS = 3  # Terms kept in memory at once
+TERM_SEASONS = ('Winter', 'Spring', 'Summer', 'Fall')
+WINTER_SESSION_END = (1, 20)  # (month, day) the Winter intersession runs until
+
+# Snapshot layout: header, newline-separated room locations, padding to
+# 8 bytes, then the BOOKING_DTYPE array. The header records the mtime and
+# size of the JSON it was built from so a stale snapshot is never used.
+SNAPSHOT_MAGIC = b'RMS1'
+SNAPSHOT_HEADER = struct.Struct('<4sIIIqq')  # magic, rooms, bookings, locations bytes, JSON mtime_ns, JSON size
+
+def current_term(today=None):
+    """
+    Returns the term classes are in on a date, e.g. "Fall_2024".
+    """
+    today = today or date.today()
+    if (today.month, today.day) <= WINTER_SESSION_END:
+        season = 'Winter'
+    elif today.month <= 5:
+        season = 'Spring'
+    elif today.month <= 7:
+        season = 'Summer'
+    else:
+        season = 'Fall'
+    return f"{season}_{today.year}"
+
+def parse_term(text):
+    """
+    Normalises a term like "fall2024", "Fall 2024" or "FALL_2024" to
+    "Fall_2024". Raises ValueError for anything else.
+    """
+    match = re.fullmatch(r'(winter|spring|summer|fall)[ _-]?(\d{4})', text.strip(), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"{text} isn't a term like Fall_2024")
+    return f"{match.group(1).title()}_{match.group(2)}"
+
+def term_order(term):
+    season, year = term.split('_')
+    return int(year), TERM_SEASONS.index(season)
+
+def _source_stamp(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+def write_snapshot(path, registry, stamp):
+    locations = '\n'.join(room.location for room in registry).encode('utf-8')
+    bookings = registry.booking_array()
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(registry), len(bookings), len(locations), *stamp)
+    padding = b'\0' * (-(len(header) + len(locations)) % 8)
+    atomic_write_bytes(path, header + locations + padding + bookings.tobytes())
+
+def read_snapshot(path, stamp):
+    """
+    Returns a RoomRegistry from a snapshot, or None if there's no snapshot
+    for this version of the JSON. The bookings are read straight out of
+    the memory-mapped file.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    magic, room_count, booking_count, locations_size, *snapshot_stamp = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or tuple(snapshot_stamp) != stamp:
+        return None
+
+    offset = SNAPSHOT_HEADER.size
+    locations = data[offset:offset + locations_size].decode('utf-8').split('\n') if room_count else []
+    offset += locations_size + (-(offset + locations_size) % 8)
+    bookings = np.frombuffer(data, dtype=BOOKING_DTYPE, count=booking_count, offset=offset)
+    return RoomRegistry.from_arrays(locations, bookings)
+
+class RoomDataset:
+    """
+    One term's room registry, kept in memory between commands.
+
+    The JSON file stays the source of truth. Next to it sits a binary
+    snapshot that loads in a few milliseconds, rebuilt whenever the JSON
+    changes. The JSON's mtime is checked at most every CHECK_INTERVAL
+    seconds, so a hand-edited or replaced file is picked up without
+    queries touching the disk in between.
+    """
+    def __init__(self, path, on_change=None):
+        self.path = path
+        self.on_change = on_change
+        self.snapshot_path = os.path.splitext(path)[0] + '.snapshot'
+        self.pages_path = os.path.splitext(path)[0] + '.pages.json'
+        self._registry = None
+        self._stamp = None
+        self._checked_at = 0
+
+    def exists(self):
+        return self._registry is not None or os.path.exists(self.path)
+
+    def get(self):
+        """
+        Returns the current RoomRegistry, or None if there's no data file.
+        """
+        now = time.monotonic()
+        if self._registry is not None and now - self._checked_at < CHECK_INTERVAL:
+            return self._registry
+        self._checked_at = now
+
+        try:
+            stamp = _source_stamp(os.stat(self.path))
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp:
+            self._registry = self._load(stamp) if stamp is not None else None
+            self._stamp = stamp
+            self._changed()
+        return self._registry
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _load(self, stamp):
+        registry = read_snapshot(self.snapshot_path, stamp)
+        if registry is not None:
+            print(f"Loaded {len(registry)} rooms from {self.snapshot_path}")
+            return registry
+
+        print(f"Loading rooms from {self.path}...")
+        with open(self.path, 'r') as file:
+            registry = RoomRegistry.from_json(json.load(file))
+        write_snapshot(self.snapshot_path, registry, stamp)
+        return registry
+
+    def load_pages(self):
+        """
+        Returns the page cache saved by the last scrape, or None.
+        """
+        try:
+            with open(self.pages_path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, registry, pages):
+        """
+        Replaces the dataset with a freshly scraped registry and the page
+        cache it was built from.
+        """
+        atomic_write_json(self.pages_path, pages)
+        atomic_write_json(self.path, registry.to_json())
+        self._stamp = _source_stamp(os.stat(self.path))
+        write_snapshot(self.snapshot_path, registry, self._stamp)
+        self._registry = registry
+        self._checked_at = time.monotonic()
+        self._changed()
+
+    def remove(self):
+        for path in (self.path, self.snapshot_path, self.pages_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._registry = self._stamp = None
+        self._changed()
+
+class RoomTerms:
+    """
+    Room datasets for every term, available as bot.rooms.
+
+    Each term's data lives in its own set of files under ROOMS_DATA_DIR.
+    A term is scraped the first time it's asked for, and refresh() keeps
+    it current with conditional GETs, so only subject pages that changed
+    are downloaded and parsed again. The most recently used terms stay in
+    memory, and evict() deletes the data of terms that ended over a year
+    ago.
+    """
+    def __init__(self, parser, directory=ROOMS_DATA_DIR):
+        self.parser = parser
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._datasets = OrderedDict()  # term -> RoomDataset, least recently used first
+        self._locks = {}
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """
+        Registers callback(term) to run whenever a term's rooms are loaded,
+        reloaded, replaced or removed.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, term):
+        for callback in self._listeners:
+            callback(term)
+
+    def dataset(self, term):
+        dataset = self._datasets.get(term)
+        if dataset is None:
+            dataset = self._datasets[term] = RoomDataset(
+                os.path.join(self.directory, f'{term}.json'), on_change=lambda: self._notify(term)
+            )
+        self._datasets.move_to_end(term)
+        while len(self._datasets) > MAX_LOADED_TERMS:
+            self._datasets.popitem(last=False)
+        return dataset
+
+    def loaded_terms(self):
+        return list(self._datasets)
+
+    def get(self, term):
+        """
+        Returns the term's RoomRegistry, or None if it hasn't been scraped.
+        """
+        return self.dataset(term).get()
+
+    async def load(self, term, http_client, progress=None):
+        """
+        Returns the term's RoomRegistry, scraping it first if needed.
+        """
+        async with self._locks.setdefault(term, asyncio.Lock()):
+            rooms = self.get(term)
+            if rooms is None:
+                rooms, _ = await self._scrape(term, http_client, progress)
+            return rooms
+
+    async def refresh(self, term, http_client, progress=None):
+        """
+        Re-checks every subject page of a term and returns (rooms, changed),
+        where changed is how many pages had to be downloaded again.
+        """
+        async with self._locks.setdefault(term, asyncio.Lock()):
+            return await self._scrape(term, http_client, progress)
+
+    async def _scrape(self, term, http_client, progress):
+        dataset = self.dataset(term)
+        rooms, pages, changed = await scrape_rooms(
+            http_client, self.parser, SCHEDULE_URL.format(term=term), progress=progress, cache=dataset.load_pages()
+        )
+        if changed or dataset.get() is None:
+            dataset.save(rooms, pages)
+        else:
+            # Nothing changed, so keep the loaded registry and its files
+            rooms = dataset.get()
+            atomic_write_json(dataset.pages_path, pages)
+        return rooms, changed
+
+    def evict(self, today=None):
+        """
+        Deletes the data of terms that ended over a year before the current
+        one.
+        """
+        year, season = term_order(current_term(today))
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or filename.endswith('.pages.json'):
+                continue
+            term = filename[:-len('.json')]
+            try:
+                stale = term_order(term) < (year - 1, season)
+            except ValueError:
+                continue
+            if stale:
+                print(f"Evicting room data for {term}")
+                self._datasets.pop(term, None)
+                RoomDataset(os.path.join(self.directory, filename), on_change=lambda: self._notify(term)).remove()
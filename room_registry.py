@@ -0,0 +1,320 @@
+import re
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+DAY_START = 0
+DAY_END = 2400
+DAYS = ('M', 'Tu', 'W', 'Th', 'F', 'Sa', 'Su')
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+NGRAM_SIZE = 3  # Longest substring indexed for location filters
+
+# One booking per row: which room, which of DAYS, and HHMM start and end
+BOOKING_DTYPE = np.dtype([('room', '<u4'), ('day', 'u1'), ('start', '<u2'), ('end', '<u2')])
+
+def minutes(hhmm):
+    return hhmm // 100 * 60 + hhmm % 100
+
+def building_code(location):
+    """
+    Returns the building part of a location, e.g. ECS for ECS-302.
+    """
+    match = re.match('[A-Za-z0-9]+', location)
+    return match.group().upper() if match else location.upper()
+
+class DaySchedule:
+    """
+    One room's bookings on one weekday as sorted, merged intervals, so
+    every query below is a single bisect.
+    """
+    __slots__ = ('starts', 'ends', '_best')
+
+    def __init__(self, intervals):
+        starts, ends = [], []
+        for start, end in sorted(intervals):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts = starts
+        self.ends = ends
+
+        # Free gap i runs from the end of interval i-1 to the start of
+        # interval i. _best[i] is the longest of gaps i and later, as
+        # (minutes, start, end), with earlier gaps winning ties.
+        self._best = [None] * (len(starts) + 2)
+        for i in reversed(range(len(starts) + 1)):
+            gap = self._gap(i, ends[i - 1] if i else DAY_START)
+            later = self._best[i + 1]
+            self._best[i] = gap if later is None or gap[0] >= later[0] else later
+
+    def _gap(self, i, start):
+        end = self.starts[i] if i < len(self.starts) else DAY_END
+        return (minutes(end) - minutes(start), start, end)
+
+    def is_open(self, time):
+        i = bisect_right(self.starts, time) - 1
+        return i < 0 or self.ends[i] < time
+
+    def next_busy(self, time):
+        """
+        Returns when the room's next booking after `time` starts, or None.
+        """
+        i = bisect_right(self.starts, time)
+        return self.starts[i] if i < len(self.starts) else None
+
+    def largest_free_window(self, time=DAY_START):
+        """
+        Returns the longest free (start, end) from `time` to the end of the
+        day, or None if the room is booked until then.
+        """
+        i = bisect_right(self.starts, time)
+        if i and self.ends[i - 1] >= time:
+            best = self._best[i]
+        else:
+            # Only the part of the current gap after `time` counts
+            partial, later = self._gap(i, time), self._best[i + 1]
+            best = partial if later is None or partial[0] >= later[0] else later
+        return best[1:] if best[0] > 0 else None
+
+class Room:
+    __slots__ = ('location', 'booked_times', '_days')
+
+    def __init__(self, location, booked_times=None):
+        self.location = location
+        self.booked_times = booked_times if booked_times is not None else []
+        self._days = None  # day -> DaySchedule, built on first query
+
+    def add_booked_time(self, day, time_tuple):
+        self.add_booking((day, time_tuple))
+
+    def add_booking(self, booking):
+        self.booked_times.append(booking)
+        self._days = None
+
+    def schedule(self, day):
+        if self._days is None:
+            intervals = {}
+            for booked_day, times in self.booked_times:
+                intervals.setdefault(booked_day, []).append(times)
+            self._days = {booked_day: DaySchedule(times) for booked_day, times in intervals.items()}
+        schedule = self._days.get(day)
+        if schedule is None:
+            schedule = self._days[day] = DaySchedule(())
+        return schedule
+
+    def is_open(self, day, current_time):
+        return self.schedule(day).is_open(current_time)
+
+    def next_busy(self, day, current_time):
+        return self.schedule(day).next_busy(current_time)
+
+    def largest_free_window(self, day, current_time=DAY_START):
+        return self.schedule(day).largest_free_window(current_time)
+    
+    def __str__(self):
+        return self.location
+
+class AvailabilityGrid:
+    """
+    Which rooms are booked in every 5-minute slot of the week, as a
+    rooms x weekdays x slots array, for questions about a stretch of time
+    rather than a single moment.
+
+    Only running totals of booked slots are kept, so whether a room is
+    free for a whole window is the difference of two of them, and every
+    room is checked at once.
+    """
+    def __init__(self, rooms, bookings):
+        self.rooms = list(rooms)
+        room_index = bookings['room'].astype(np.intp)
+        day_index = bookings['day'].astype(np.intp)
+        start, end = bookings['start'].astype(np.intp), bookings['end'].astype(np.intp)
+        first_slot = (start // 100 * 60 + start % 100) // SLOT_MINUTES
+        last_slot = np.minimum((end // 100 * 60 + end % 100) // SLOT_MINUTES, SLOTS_PER_DAY - 1)
+
+        # +1 where a booking starts and -1 after it ends, summed into booked slots
+        shape = (len(self.rooms), len(DAYS), SLOTS_PER_DAY + 1)
+        row = (room_index * len(DAYS) + day_index) * (SLOTS_PER_DAY + 1)
+        size = shape[0] * shape[1] * shape[2]
+        changes = np.bincount(row + first_slot, minlength=size) - np.bincount(row + last_slot + 1, minlength=size)
+        booked = np.cumsum(changes.reshape(shape), axis=2)[:, :, :SLOTS_PER_DAY] > 0
+
+        # booked_before[room, day, i] is how many of the day's first i slots are booked
+        self.booked_before = np.zeros((len(self.rooms), len(DAYS), SLOTS_PER_DAY + 1), dtype=np.int16)
+        np.cumsum(booked, axis=2, out=self.booked_before[:, :, 1:])
+
+    def free_between(self, day, start, end, candidates=None):
+        """
+        Returns the rooms with no booking at all from `start` to `end` on a
+        weekday. Times are HHMM, and end is capped at the end of the day.
+        If `candidates` is given, only rooms at those positions are checked.
+        """
+        first = minutes(start) // SLOT_MINUTES
+        last = -(-minutes(min(end, DAY_END)) // SLOT_MINUTES)
+        day_totals = self.booked_before[:, DAYS.index(day)]
+        if candidates is not None:
+            candidates = np.asarray(candidates, dtype=np.intp)
+            day_totals = day_totals[candidates]
+        free = day_totals[:, max(last, first + 1)] == day_totals[:, first]
+        indices = np.flatnonzero(free) if candidates is None else candidates[free]
+        return [self.rooms[index] for index in indices.tolist()]
+
+class LocationIndex:
+    """
+    Every room's location indexed two ways, so a location filter picks its
+    rooms before anything checks their bookings: building codes in sorted
+    order for prefix lookups, and every piece of up to NGRAM_SIZE
+    characters for substring matches. Rooms are referred to by their
+    position in the registry, the same numbering AvailabilityGrid uses.
+    """
+    def __init__(self, rooms):
+        self.rooms = list(rooms)
+        self._lowered = [room.location.lower() for room in self.rooms]
+        self._buildings = {}  # building code -> room positions
+        self._grams = {}  # lower-cased substring -> set of room positions
+        for index, location in enumerate(self._lowered):
+            self._buildings.setdefault(building_code(self.rooms[index].location), []).append(index)
+            for size in range(1, NGRAM_SIZE + 1):
+                for start in range(len(location) - size + 1):
+                    self._grams.setdefault(location[start:start + size], set()).add(index)
+        self._codes = sorted(self._buildings)
+
+    def matching(self, text):
+        """
+        Returns the positions of rooms whose location contains `text`,
+        ignoring case, in registry order.
+        """
+        text = text.lower()
+        if len(text) <= NGRAM_SIZE:
+            return sorted(self._grams.get(text, ())) if text else list(range(len(self.rooms)))
+        grams = sorted(
+            (self._grams.get(text[start:start + NGRAM_SIZE], set()) for start in range(len(text) - NGRAM_SIZE + 1)),
+            key=len
+        )
+        # Containing every piece doesn't mean containing them in order
+        return sorted(index for index in grams[0].intersection(*grams[1:]) if text in self._lowered[index])
+
+    def buildings(self, prefix=''):
+        """
+        Returns {building code: room positions} for every building whose
+        code starts with `prefix`, ignoring case, in code order.
+        """
+        prefix = prefix.upper()
+        buildings = {}
+        for code in self._codes[bisect_left(self._codes, prefix):]:
+            if not code.startswith(prefix):
+                break
+            buildings[code] = self._buildings[code]
+        return buildings
+
+class RoomRegistry:
+    """
+    Every room on the class schedule, keyed by location.
+
+    Bookings are interned per (day, start, end), so the thousands of
+    sections that share a time slot share one tuple. Each scrape or load
+    builds a fresh registry.
+    """
+    def __init__(self):
+        self._rooms = {}
+        self._bookings = {}  # (day, start, end) -> (day, (start, end))
+        self._booking_array = None
+        self._grid = None
+        self._locations = None
+
+    def add_room(self, location):
+        room = self._rooms.get(location)
+        if room is None:
+            room = self._rooms[location] = Room(location)
+            self._booking_array = self._grid = self._locations = None
+        return room
+
+    def add_booking(self, location, day, start, end):
+        booking = self._bookings.get((day, start, end))
+        if booking is None:
+            booking = self._bookings[(day, start, end)] = (day, (start, end))
+        self.add_room(location).add_booking(booking)
+        self._booking_array = self._grid = None
+
+    def booking_array(self):
+        """
+        Returns every booking on one of DAYS as a BOOKING_DTYPE array, with
+        rooms numbered in iteration order. Bookings with times that aren't
+        on the clock are left out.
+        """
+        if self._booking_array is None:
+            rows = [
+                (index, DAYS.index(day), start, end)
+                for index, room in enumerate(self)
+                for day, (start, end) in room.booked_times
+                if day in DAYS and 0 <= start <= DAY_END and 0 <= end <= DAY_END
+            ]
+            self._booking_array = np.array(rows, dtype=BOOKING_DTYPE)
+        return self._booking_array
+
+    def availability(self):
+        """
+        Returns the AvailabilityGrid for every room, built on first use.
+        """
+        if self._grid is None:
+            self._grid = AvailabilityGrid(self, self.booking_array())
+        return self._grid
+
+    def locations(self):
+        """
+        Returns the LocationIndex for every room, built on first use.
+        """
+        if self._locations is None:
+            self._locations = LocationIndex(self)
+        return self._locations
+
+    def get(self, location):
+        return self._rooms.get(location)
+
+    def __iter__(self):
+        return iter(self._rooms.values())
+
+    def __len__(self):
+        return len(self._rooms)
+
+    @classmethod
+    def from_json(cls, rooms_dicts):
+        registry = cls()
+        for room_dict in rooms_dicts:
+            # Rooms with no bookings still belong in the registry
+            registry.add_room(room_dict['location'])
+            for day, (start, end) in room_dict['booked_times']:
+                registry.add_booking(room_dict['location'], day, start, end)
+        return registry
+
+    @classmethod
+    def from_arrays(cls, locations, bookings):
+        """
+        Builds a registry from room locations and a BOOKING_DTYPE array,
+        the way they're stored in a snapshot, without a Python loop over
+        the bookings.
+        """
+        registry = cls()
+        rooms = [registry.add_room(location) for location in locations]
+
+        # Intern each distinct (day, start, end) once and point every booking at it
+        keys = (bookings['day'].astype(np.int64) << 32) | (bookings['start'].astype(np.int64) << 16) | bookings['end']
+        distinct, interned_index = np.unique(keys, return_inverse=True)
+        interned = []
+        for key in distinct.tolist():
+            day, start, end = DAYS[key >> 32], (key >> 16) & 0xFFFF, key & 0xFFFF
+            interned.append(registry._bookings.setdefault((day, start, end), (day, (start, end))))
+
+        order = np.argsort(bookings['room'], kind='stable')
+        bounds = np.searchsorted(bookings['room'][order], np.arange(len(rooms) + 1)).tolist()
+        interned_index = interned_index[order].tolist()
+        for index, room in enumerate(rooms):
+            room.booked_times = list(map(interned.__getitem__, interned_index[bounds[index]:bounds[index + 1]]))
+
+        registry._booking_array = bookings
+        return registry
+
+    def to_json(self):
+        return [{'location': room.location, 'booked_times': room.booked_times} for room in self]
@@ -0,0 +1,291 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+from fanout import describe_failure
+from room_registry import RoomRegistry
+
+# lxml builds the same tree several times faster, when it's installed
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+SCRAPE_CONCURRENCY = 8  # Subject pages downloaded at once
+SCRAPE_RETRIES = 3  # Extra attempts for a page after the first one fails
+RETRY_BACKOFF = 1  # Seconds before the first retry, doubled after each one
+PROGRESS_INTERVAL = 2  # Seconds between progress reports
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+class RoomScrapeError(Exception):
+    pass
+
+def parse_sections_table(table):
+    sections = []
+    headers = [th.text.strip() for th in table.find_all('th', scope='col')]
+    
+    for row in table.find_all('tr')[1:]:  # Skipping the header row
+        cells = row.find_all(['th', 'td'])
+        section_info = {headers[i]: cells[i].get_text(strip=True) for i in range(len(cells))}
+        sections.append(section_info)
+
+    formatted = []
+    for section in sections:
+        start_time, end_time = parse_times(section['TIME'])
+        if section['DAYS'] == 'TBA' or section['DAYS'] == 'NA':
+            continue
+        for day in parse_days(section['DAYS']):
+            formatted_section = {
+                "Location": section['LOCATION'],
+                "Day": day,
+                "Start": start_time,
+                "End": end_time
+            }
+            formatted.append(formatted_section)
+
+    return formatted
+
+def parse_times(time_str):
+    if time_str == 'TBA' or time_str == 'NA':
+        return (0, 0)
+
+    start_time_str, end_time_str = time_str.split('-')
+
+    if 'am' in end_time_str.lower() and 'am' not in start_time_str.lower() and 'pm' not in start_time_str.lower():
+        start_time_str += 'am'
+    elif 'pm' in end_time_str.lower() and 'pm' not in start_time_str.lower() and 'am' not in start_time_str.lower():
+        start_time_str += 'pm'
+
+    start_time = time_to_24h(start_time_str)
+    end_time = time_to_24h(end_time_str)
+
+    if start_time > end_time:
+        start_time -= 1200
+
+    return (start_time, end_time)
+
+def time_to_24h(t_str):
+    t_str = t_str.lower()
+    is_pm = 'pm' in t_str
+    t_str = t_str.replace('am', '').replace('pm', '')
+
+    if ':' in t_str:
+        hours, minutes = t_str.split(':')
+    else:
+        hours, minutes = t_str, '00'
+
+    hours, minutes = int(hours), int(minutes)
+
+    if is_pm and hours < 12:
+        hours += 12
+    elif not is_pm and hours == 12:
+        hours = 0
+
+    return (hours * 100) + minutes
+
+def parse_days(days_str):
+    return [day for day in re.findall('[A-Z][^A-Z]*', days_str)]
+
+def get_subjects(html):
+    toplink_divs = html.find_all('div', class_='indexList')
+    hrefs = []
+    for div in toplink_divs:
+        links = div.find_all('a')
+        for link in links:
+            if link.get('href') != None and link.get('href') != "#":
+                hrefs.append(link.get('href'))
+    return hrefs
+
+class SectionStrainer(SoupStrainer):
+    """
+    Only lets courseHeader divs and tables into the tree, so the rest of a
+    schedule page is never built.
+    """
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        classes = (attrs or {}).get('class')
+        if isinstance(classes, str):
+            classes = classes.split()
+        return name == 'table' or (name == 'div' and classes == ['courseHeader'])
+
+    def allow_string_creation(self, string):
+        return False
+
+def parse_subject_page(html):
+    """
+    Returns (location, day, start, end) for every course section on a
+    subject page, one per meeting day. Runs inside a worker process, so it
+    returns plain tuples rather than soup.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SectionStrainer())
+    sections = []
+    for course_header in soup.find_all('div', class_='courseHeader'):
+        sections_table = course_header.find_next_sibling('table')
+        if sections_table:
+            for section in parse_sections_table(sections_table):
+                sections.append((section['Location'], section['Day'], section['Start'], section['End']))
+    return sections
+
+class PageParser:
+    """
+    Parses schedule pages in a pool of worker processes, available as
+    bot.page_parser, so a scrape never blocks the event loop.
+
+    The pool is forked once in setup_hook, right after the chart pool and
+    before the bot starts any threads of its own, since forking a process
+    with threads can leave a worker holding a lock nobody will release.
+    Every scrape after that reuses the same workers.
+    """
+    def __init__(self, workers=PARSE_WORKERS):
+        self.workers = workers
+        # Fork so workers don't re-run locomotion.py the way spawn would
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+
+    async def start(self):
+        """
+        Starts every worker up front, while it's still safe to fork.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, abs, 0) for _ in range(self.workers)))
+
+    async def parse(self, html):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, parse_subject_page, html)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def _validators(response, cached=None):
+    cached = cached or {}
+    return {
+        'etag': response.headers.get('ETag', cached.get('etag')),
+        'last_modified': response.headers.get('Last-Modified', cached.get('last_modified')),
+    }
+
+async def fetch_page(http_client, url, cached=None, retries=SCRAPE_RETRIES):
+    """
+    Returns (html, validators) for a page, retrying connection errors,
+    timeouts and server errors with exponential backoff. If `cached` holds
+    the ETag/Last-Modified of an earlier fetch the request is conditional,
+    and html is None when the page hasn't changed since. Raises
+    RoomScrapeError once the retries run out or the server rejects the
+    request outright.
+    """
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    delay = RETRY_BACKOFF
+    for attempt in range(retries + 1):
+        try:
+            async with http_client.get(url, headers=headers) as response:
+                if response.status == 304 and headers:
+                    return None, _validators(response, cached)
+                if response.status == 200:
+                    return await response.text(), _validators(response)
+                error = RoomScrapeError(f"HTTP {response.status}")
+                if response.status < 500 and response.status != 429:
+                    break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = e
+        if attempt < retries:
+            await asyncio.sleep(delay)
+            delay *= 2
+    raise RoomScrapeError(f"{url}: {describe_failure(error)}") from error
+
+async def scrape_rooms(http_client, parser, base_url, progress=None, cache=None):
+    """
+    Scrapes every subject page listed on the schedule index at base_url.
+    Returns (rooms, cache, changed): a RoomRegistry of every room with a
+    scheduled section, the page cache to pass to the next scrape, and how
+    many pages actually had to be downloaded.
+
+    With a cache from an earlier scrape every request is a conditional
+    GET, and pages that come back 304 reuse their cached sections instead
+    of being downloaded and parsed again. Fetching, parsing and merging
+    run as separate stages joined by queues, so pages are parsed and
+    merged while others are still downloading, SCRAPE_CONCURRENCY at a
+    time. Parsing happens in the parser's worker processes so the event
+    loop stays free. progress(done, total) is awaited at most every
+    PROGRESS_INTERVAL seconds and once at the end. Raises RoomScrapeError
+    if a page can't be fetched after its retries and has no cached copy,
+    rather than returning a schedule with holes in it.
+    """
+    cache = cache or {'index': None, 'pages': {}}
+    html, index_validators = await fetch_page(http_client, base_url, cache['index'])
+    if html is None:
+        subjects = cache['index']['subjects']
+    else:
+        subjects = get_subjects(BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer('div', class_='indexList')))
+    changed = 0 if html is None else 1
+
+    subject_queue = asyncio.Queue()
+    for subject in subjects:
+        subject_queue.put_nowait(subject)
+    pages = asyncio.Queue(maxsize=SCRAPE_CONCURRENCY)
+    parsed = asyncio.Queue()
+    failures = []
+    rooms = RoomRegistry()
+    new_cache = {'index': dict(index_validators, subjects=subjects), 'pages': {}}
+
+    async def fetch_stage():
+        nonlocal changed
+        while not subject_queue.empty():
+            subject = subject_queue.get_nowait()
+            cached = cache['pages'].get(subject)
+            try:
+                html, validators = await fetch_page(http_client, base_url + subject, cached)
+            except RoomScrapeError as e:
+                if cached is None:
+                    failures.append(e)
+                    await parsed.put((subject, None, []))
+                else:
+                    print(f"Keeping the cached copy of {subject}: {e}")
+                    await parsed.put((subject, cached, cached['sections']))
+                continue
+            if html is None:
+                await parsed.put((subject, validators, cached['sections']))
+            else:
+                changed += 1
+                await pages.put((subject, validators, html))
+
+    async def parse_stage():
+        while True:
+            page = await pages.get()
+            if page is None:
+                return
+            subject, validators, html = page
+            await parsed.put((subject, validators, await parser.parse(html)))
+
+    async def merge_stage():
+        last_report = time.monotonic()
+        for done in range(1, len(subjects) + 1):
+            subject, validators, sections = await parsed.get()
+            for location, day, start, end in sections:
+                rooms.add_booking(location, day, start, end)
+            if validators is not None:
+                new_cache['pages'][subject] = {'etag': validators.get('etag'), 'last_modified': validators.get('last_modified'), 'sections': sections}
+            if progress is not None and (done == len(subjects) or time.monotonic() - last_report >= PROGRESS_INTERVAL):
+                last_report = time.monotonic()
+                await progress(done, len(subjects))
+
+    async def fetch_then_stop_parsers():
+        await asyncio.gather(*(fetch_stage() for _ in range(SCRAPE_CONCURRENCY)))
+        for _ in range(parser.workers):
+            await pages.put(None)
+
+    tasks = [asyncio.create_task(fetch_then_stop_parsers()), asyncio.create_task(merge_stage())]
+    tasks += [asyncio.create_task(parse_stage()) for _ in range(parser.workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Don't leave the other stages waiting on a queue if one of them failed
+        for task in tasks:
+            task.cancel()
+
+    if failures:
+        raise RoomScrapeError(f"Couldn't fetch {len(failures)} of {len(subjects)} subject pages, e.g. {failures[0]}")
+    return rooms, new_cache, changed
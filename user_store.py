@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import sqlite3
+from atomic_file import atomic_write_json
+
+USER_INFO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'user_info.json')
+USER_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'user_info.db')
+FLUSH_DELAY = 5  # Seconds to wait for more writes before flushing to disk
+
+# Fields every tracked user has; everything else is custom profile info
+USER_COLUMNS = ('github_username', 'points', 'streak_weeks', 'shame_count')
+RANKED_FIELDS = ('points', 'streak_weeks', 'shame_count')
+
+def coerce_ranked(fields):
+    """
+    Returns a copy of fields with every ranked field as an int, so rankings
+    can always compare them. Raises ValueError if one isn't a whole number.
+    """
+    coerced = dict(fields)
+    for field in RANKED_FIELDS:
+        if field not in fields:
+            continue
+        value = fields[field]
+        try:
+            # int() would quietly turn True into 1 and 2.5 into 2
+            if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+                raise ValueError
+            coerced[field] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} has to be a whole number, not {value!r}") from None
+    return coerced
+
+class UserStore:
+    """
+    Shared in-memory copy of user_info.json.
+
+    The file is read once when the bot starts. Reads are served from memory,
+    and writes mark the store dirty so several changes made close together
+    end up in a single atomic flush (temp file + rename).
+    """
+    def __init__(self, path=USER_INFO_FILE, flush_delay=FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._data = {}
+        self._dirty = False
+        self._flush_handle = None
+        self._listeners = []
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                self._data = json.load(file)
+        except FileNotFoundError:
+            self._data = {}
+        self._dirty = False
+        return self
+
+    def all(self):
+        """
+        Returns the full user dict. Treat it as read-only and use update()
+        and friends to change it, otherwise the change is never saved.
+        """
+        return self._data
+
+    def get(self, user_id, default=None):
+        return self._data.get(str(user_id), default)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def update(self, user_id, fields):
+        """
+        Merges fields into a user's entry, creating the user if needed.
+        Raises ValueError if a ranked field isn't a whole number.
+        """
+        self._data.setdefault(str(user_id), {}).update(coerce_ranked(fields))
+        self._mark_dirty({str(user_id)})
+
+    def remove_keys(self, user_id, keys):
+        info = self._data.get(str(user_id))
+        if info is None:
+            return
+        for key in keys:
+            info.pop(key, None)
+        self._mark_dirty({str(user_id)})
+
+    def replace_all(self, data):
+        self._data = {user_id: coerce_ranked(info) for user_id, info in data.items()}
+        self._mark_dirty(None)
+
+    def add_listener(self, callback):
+        """
+        Registers callback(user_ids) to run after every write. user_ids is
+        the set of changed user IDs, or None if everything may have changed.
+        """
+        self._listeners.append(callback)
+
+    def ranked(self, field, limit=None):
+        """
+        Returns (user_id, info) pairs for users with a GitHub username,
+        highest `field` first and tied users by ID.
+        """
+        tracked = [(user_id, info) for user_id, info in self._data.items() if 'github_username' in info]
+        entries = sorted(tracked, key=lambda entry: (-entry[1].get(field, 0), entry[0]))
+        return entries if limit is None else entries[:limit]
+
+    def _mark_dirty(self, user_ids):
+        for callback in self._listeners:
+            callback(user_ids)
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not inside the bot's event loop, nothing to coalesce with
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        """
+        Writes the store to disk if anything changed since the last flush.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+
+        atomic_write_json(self.path, self._data, indent=4)
+        self._dirty = False
+
+    async def close(self):
+        self.flush()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    github_username TEXT,
+    points INTEGER,
+    streak_weeks INTEGER,
+    shame_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS user_fields (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+CREATE INDEX IF NOT EXISTS users_points ON users(points) WHERE github_username IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_streak_weeks ON users(streak_weeks) WHERE github_username IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_shame_count ON users(shame_count) WHERE github_username IS NOT NULL;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class SQLiteUserStore:
+    """
+    UserStore backed by SQLite in WAL mode.
+
+    The standard fields live in typed, indexed columns so rankings are
+    ORDER BY/LIMIT queries, and custom profile keys live in a side table
+    as JSON values. Every write touches only the rows it changes. On first
+    start the existing user_info.json is imported once.
+    """
+    def __init__(self, path=USER_DB_FILE, json_path=USER_INFO_FILE):
+        self.path = path
+        self.json_path = json_path
+        self._db = None
+        self._listeners = []
+
+    def load(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.executescript(SCHEMA)
+        self._migrate_from_json()
+        return self
+
+    def _migrate_from_json(self):
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+            return
+        try:
+            with open(self.json_path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+        with self._db:
+            for user_id, info in data.items():
+                self._write(user_id, info)
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (self.json_path,))
+        print(f"Migrated {len(data)} users from {self.json_path} to {self.path}")
+
+    def _write(self, user_id, fields):
+        user_id = str(user_id)
+        self._db.execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+        columns = [column for column in USER_COLUMNS if column in fields]
+        if columns:
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            self._db.execute(
+                f'UPDATE users SET {assignments} WHERE user_id = ?',
+                [fields[column] for column in columns] + [user_id]
+            )
+        self._db.executemany(
+            'INSERT INTO user_fields (user_id, key, value) VALUES (?, ?, ?) '
+            'ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value',
+            [(user_id, key, json.dumps(value)) for key, value in fields.items() if key not in USER_COLUMNS]
+        )
+
+    @staticmethod
+    def _row_to_info(row):
+        return {column: value for column, value in zip(USER_COLUMNS, row) if value is not None}
+
+    def all(self):
+        data = {}
+        for row in self._db.execute(f'SELECT user_id, {", ".join(USER_COLUMNS)} FROM users ORDER BY rowid'):
+            data[row[0]] = self._row_to_info(row[1:])
+        for user_id, key, value in self._db.execute('SELECT user_id, key, value FROM user_fields ORDER BY rowid'):
+            data[user_id][key] = json.loads(value)
+        return data
+
+    def get(self, user_id, default=None):
+        row = self._db.execute(
+            f'SELECT {", ".join(USER_COLUMNS)} FROM users WHERE user_id = ?', (str(user_id),)
+        ).fetchone()
+        if row is None:
+            return default
+        info = self._row_to_info(row)
+        for key, value in self._db.execute(
+            'SELECT key, value FROM user_fields WHERE user_id = ? ORDER BY rowid', (str(user_id),)
+        ):
+            info[key] = json.loads(value)
+        return info
+
+    def __contains__(self, user_id):
+        return self._db.execute('SELECT 1 FROM users WHERE user_id = ?', (str(user_id),)).fetchone() is not None
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, user_ids):
+        for callback in self._listeners:
+            callback(user_ids)
+
+    def update(self, user_id, fields):
+        fields = coerce_ranked(fields)
+        with self._db:
+            self._write(user_id, fields)
+        self._notify({str(user_id)})
+
+    def remove_keys(self, user_id, keys):
+        columns = [key for key in keys if key in USER_COLUMNS]
+        with self._db:
+            if columns:
+                assignments = ', '.join(f'{column} = NULL' for column in columns)
+                self._db.execute(f'UPDATE users SET {assignments} WHERE user_id = ?', (str(user_id),))
+            self._db.executemany(
+                'DELETE FROM user_fields WHERE user_id = ? AND key = ?',
+                [(str(user_id), key) for key in keys if key not in USER_COLUMNS]
+            )
+        self._notify({str(user_id)})
+
+    def replace_all(self, data):
+        data = {user_id: coerce_ranked(info) for user_id, info in data.items()}
+        with self._db:
+            self._db.execute('DELETE FROM user_fields')
+            self._db.execute('DELETE FROM users')
+            for user_id, info in data.items():
+                self._write(user_id, info)
+        self._notify(None)
+
+    def ranked(self, field, limit=None):
+        """
+        Returns (user_id, info) pairs for users with a GitHub username,
+        highest `field` first and tied users by ID. Only the standard fields
+        are included.
+        """
+        if field not in RANKED_FIELDS:
+            raise ValueError(f"Can't rank by {field}")
+        rows = self._db.execute(
+            f'SELECT user_id, {", ".join(USER_COLUMNS)} FROM users '
+            f'WHERE github_username IS NOT NULL ORDER BY {field} DESC, user_id LIMIT ?',
+            (-1 if limit is None else limit,)
+        )
+        return [(row[0], self._row_to_info(row[1:])) for row in rows]
+
+    def flush(self):
+        # Every write is already committed
+        pass
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+def open_user_store(backend='json'):
+    """
+    Creates the user store for the configured backend ("json" or "sqlite").
+    """
+    if backend == 'sqlite':
+        return SQLiteUserStore().load()
+    if backend == 'json':
+        return UserStore().load()
+    raise ValueError(f"Unknown user store backend: {backend}")